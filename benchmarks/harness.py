@@ -0,0 +1,225 @@
+"""
+Benchmark harness for whaler. Generates a synthetic campaign, times the main
+extraction and analysis paths against it, reports throughput in files/s and
+MB/s, and flags regressions against a stored baseline.
+
+Usage:
+    
+    >> python -m benchmarks.harness [--structs N] [--save] [--only NAME ...]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks import synthetic
+
+baseline_default = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+def quiet():
+    """Silences whaler's progress messages while timing.
+    """
+    return contextlib.redirect_stdout(io.StringIO())
+
+def logs(root, suffix):
+    """Gives (struct, file, path, size) for every log with the given suffix.
+    """
+    found = []
+    for struct in sorted(next(os.walk(root))[1]):
+        path = os.path.join(root, struct)
+        for file in sorted(os.listdir(path)):
+            if file.endswith(suffix):
+                size = os.path.getsize(os.path.join(path, file))
+                found.append((struct, file, path, size))
+    return found
+
+class Benchmarks():
+    """The set of timed whaler operations, run against a campaign directory.
+    Each benchmark returns the number of files and bytes it processed.
+    """
+    def __init__(self, root):
+        self.root = root
+        self.geo = logs(root, "geo.log")
+        self.freq = logs(root, "freq.log")
+        self.names = [
+            'get_values', 'finalE', 'thermo_vals', 'groundstates_all',
+            'therm_N2_act', 'filegen']
+    
+    def setup(self):
+        """Imports whaler outside of the timed region, and turns off the
+        caches and side outputs so that every run parses the logs from
+        scratch.
+        """
+        from whaler import config
+        import whaler.analysis
+        import whaler.custom
+        import whaler.filegen
+        config.analysis['cache'] = None
+        config.analysis['coords'] = None
+        config.analysis['spectra'] = False
+        config.analysis['jobs'] = 1
+        config.analysis['format'] = 'csv'
+    
+    def analysis(self):
+        from whaler.analysis import Analysis
+        return Analysis()
+    
+    def get_values(self):
+        from whaler.dataprep import IO
+        A = self.analysis()
+        for struct in A.structs:
+            dir = IO(dir=os.path.join(self.root, struct))
+            dir.get_values(struct, "geo.log", A.geovalid, A.finalE)
+        return (len(self.geo), sum(log[3] for log in self.geo))
+    
+    def finalE(self):
+        from whaler.dataprep import LogScan
+        A = self.analysis()
+        for struct, file, path, size in self.geo:
+            A.finalE(LogScan(file, path))
+        return (len(self.geo), sum(log[3] for log in self.geo))
+    
+    def thermo_vals(self):
+        from whaler.dataprep import LogScan
+        A = self.analysis()
+        for struct, file, path, size in self.freq:
+            A.thermo_vals(LogScan(file, path))
+        return (len(self.freq), sum(log[3] for log in self.freq))
+    
+    def groundstates_all(self):
+        self.analysis().groundstates_all()
+        return (len(self.geo), sum(log[3] for log in self.geo))
+    
+    def therm_N2_act(self):
+        from whaler.custom import Reactions
+        Reactions().therm_N2_act()
+        return (len(self.freq), sum(log[3] for log in self.freq))
+    
+    def filegen(self):
+        from whaler.filegen import Generator
+        gendir = tempfile.mkdtemp(prefix="whaler_filegen_")
+        try:
+            guide = synthetic.make_filegen(gendir, 8, 8)
+            os.chdir(gendir)
+            sys.modules.pop(guide, None)
+            Generator(guide).run()
+            files = [os.path.join(d, f) for d, dirs, fs in os.walk(gendir)
+                        for f in fs if f.endswith('.inp')]
+            size = sum(os.path.getsize(f) for f in files)
+        finally:
+            os.chdir(self.root)
+            shutil.rmtree(gendir, ignore_errors=True)
+        return (len(files), size)
+    
+    def run(self, name, repeat=1):
+        """Runs a benchmark repeat times in the campaign directory, returning
+        the best time along with its throughput.
+        """
+        best = None
+        for i in range(repeat):
+            os.chdir(self.root)
+            with quiet():
+                start = time.perf_counter()
+                files, size = getattr(self, name)()
+                seconds = time.perf_counter() - start
+            if best is None or seconds < best:
+                best = seconds
+        return {
+            'seconds':best, 'files':files, 'MB':size/2**20,
+            'files/s':files/best, 'MB/s':size/2**20/best}
+
+def compare(results, baseline, tolerance):
+    """Returns the names of the benchmarks whose throughput has dropped by
+    more than tolerance (a fraction) from the baseline.
+    """
+    regressions = []
+    for name, result in results.items():
+        if name in baseline:
+            if result['files/s'] < baseline[name]['files/s']*(1 - tolerance):
+                regressions.append(name)
+    return regressions
+
+def report(results, baseline, regressions):
+    """Prints the results as a table.
+    """
+    print("{0:<18}{1:>10}{2:>8}{3:>10}{4:>12}{5:>10}{6:>10}".format(
+            'benchmark', 'seconds', 'files', 'MB', 'files/s', 'MB/s',
+            'vs base'))
+    for name, r in results.items():
+        if name in baseline:
+            change = "%+.0f%%" % (
+                100*(r['files/s']/baseline[name]['files/s'] - 1))
+        else:
+            change = "-"
+        flag = "  REGRESSION" if name in regressions else ""
+        print("{0:<18}{1:>10.3f}{2:>8d}{3:>10.1f}{4:>12.1f}{5:>10.1f}"
+                "{6:>10}{7}".format(
+                name, r['seconds'], r['files'], r['MB'], r['files/s'],
+                r['MB/s'], change, flag))
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--structs', type=int, default=1000,
+                        help="number of structure directories to generate")
+    parser.add_argument('--geo-kb', type=int, default=64,
+                        help="approximate size of each geo.log")
+    parser.add_argument('--freq-kb', type=int, default=256,
+                        help="approximate size of each freq.log")
+    parser.add_argument('--dir', default=None,
+                        help="existing campaign to use instead of generating "
+                             "one (it is kept afterwards)")
+    parser.add_argument('--only', nargs='*', default=None,
+                        help="benchmarks to run")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="runs per benchmark; the best is reported")
+    parser.add_argument('--baseline', default=baseline_default,
+                        help="baseline JSON file")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="allowed fractional throughput drop")
+    parser.add_argument('--save', action='store_true',
+                        help="store these results as the new baseline")
+    opts = parser.parse_args(args)
+    
+    cwd = os.getcwd()
+    if opts.dir is None:
+        root = tempfile.mkdtemp(prefix="whaler_bench_")
+        print("Generating %d structures in %s." % (opts.structs, root))
+        synthetic.make_campaign(root, opts.structs, opts.geo_kb, opts.freq_kb)
+    else:
+        root = os.path.abspath(opts.dir)
+    
+    try:
+        bench = Benchmarks(root)
+        bench.setup()
+        names = opts.only or bench.names
+        results = {name:bench.run(name, opts.repeat) for name in names}
+    finally:
+        os.chdir(cwd)
+        if opts.dir is None:
+            shutil.rmtree(root, ignore_errors=True)
+    
+    try:
+        with open(opts.baseline, "rt") as f:
+            baseline = json.load(f)
+    except (OSError, ValueError):
+        baseline = {}
+    
+    regressions = compare(results, baseline, opts.tolerance)
+    report(results, baseline, regressions)
+    
+    if opts.save:
+        baseline.update(results)
+        with open(opts.baseline, "wt") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print("Saved baseline to %s." % opts.baseline)
+    
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""
+Startup benchmark for the whaler command line. Times light subcommands in
+fresh interpreters, subtracting the time of a bare interpreter, and checks
+that they do not import numpy or pandas.
+
+Usage:
+    
+    >> python -m benchmarks.startup [--repeat N] [--budget MS]
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import synthetic
+
+heavy = ['numpy', 'pandas']
+
+def timed(cmd, cwd, repeat):
+    """Runs a command repeat times, returning the best time in ms.
+    """
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(cmd, cwd=cwd, stdout=subprocess.DEVNULL, check=True)
+        ms = 1000*(time.perf_counter() - start)
+        if best is None or ms < best:
+            best = ms
+    return best
+
+def imported(args, cwd):
+    """Runs whaler with the given arguments in a fresh interpreter, returning
+    the heavy modules it imported.
+    """
+    code = (
+        "import sys\n"
+        "from whaler.__main__ import main\n"
+        "main(%r)\n"
+        "print(' '.join(m for m in %r if m in sys.modules))\n"
+        % (args, heavy))
+    out = subprocess.run(
+        [sys.executable, '-c', code], cwd=cwd, capture_output=True,
+        text=True, check=True).stdout
+    return out.splitlines()[-1].split() if out.strip() else []
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--repeat', type=int, default=10,
+                        help="runs per command; the best is reported")
+    parser.add_argument('--budget', type=float, default=100,
+                        help="allowed startup time in ms, over a bare "
+                             "interpreter")
+    opts = parser.parse_args(args)
+    
+    # Run from a filegen campaign, with whaler importable from the checkout.
+    root = tempfile.mkdtemp(prefix="whaler_startup_")
+    package = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    os.environ['PYTHONPATH'] = os.pathsep.join(
+        [package] + os.environ.get('PYTHONPATH', '').split(os.pathsep))
+    commands = {
+        '--help' : ['--help'],
+        'filegen' : ['filegen', '--dry-run', 'guide'],
+        }
+    
+    try:
+        synthetic.make_filegen(root, 2, 2)
+        bare = timed([sys.executable, '-c', 'pass'], root, opts.repeat)
+        print("{0:<12}{1:>10}{2:>10}  {3}".format(
+                'command', 'ms', '+ms', 'heavy imports'))
+        print("{0:<12}{1:>10.1f}{2:>10}".format('(python)', bare, '-'))
+        
+        failed = []
+        for name, cmd in commands.items():
+            ms = timed(
+                [sys.executable, '-m', 'whaler'] + cmd, root, opts.repeat)
+            modules = imported(cmd, root)
+            flag = ""
+            if ms - bare > opts.budget or modules:
+                failed.append(name)
+                flag = "  OVER BUDGET"
+            print("{0:<12}{1:>10.1f}{2:>10.1f}  {3}{4}".format(
+                    name, ms, ms - bare, ' '.join(modules) or '-', flag))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
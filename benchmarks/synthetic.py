@@ -0,0 +1,279 @@
+"""
+This module generates synthetic ORCA campaigns for benchmarking whaler: trees
+of structure directories with xxxxxxx_NSyyy naming, containing geo and freq
+.log files of a configurable size and aligned .xyz files.
+"""
+
+import os
+import random
+
+metals = ['Cr', 'Mo', 'W', 'Mn', 'Tc', 'Re', 'Fe', 'Ru', 'Os', 'Co', 'Rh', 'Ir']
+ligands = ['OO', 'ON', 'NN', 'OS', 'SS', 'NS', 'OP', 'NP', 'PP', 'SP']
+families = [('4', 0), ('4N', 1), ('4N2', 2)]
+
+def scf_block(E, lines):
+    """Gives the lines of an SCF iteration table, used to pad the logs.
+    """
+    block = ["ITER       Energy         Delta-E        Max-DP      RMS-DP"]
+    for i in range(lines):
+        block.append("  %2d  %16.10f  %12.10f  %10.8f  %10.8f" % (
+                        i, E + 1.0/(i+1), 1.0/(i+1)**2, 0.01/(i+1),
+                        0.001/(i+1)))
+    return block
+
+def properties_block(geometry):
+    """Gives the population analyses, dipole moment and <S**2> printed after
+    a single point calculation of the given atoms.
+    """
+    out = []
+    for method in ['MULLIKEN', 'LOEWDIN']:
+        title = method + " ATOMIC CHARGES AND SPIN POPULATIONS"
+        out += ["-"*len(title), title, "-"*len(title)]
+        for i, atom in enumerate(geometry):
+            out.append("%4d %-2s:   %9.6f   %9.6f" % (
+                        i, atom[0], 0.1*(-1)**i, 2.0/len(geometry)))
+        if method == 'MULLIKEN':
+            out += ["Sum of atomic charges         :    0.0000000",
+                    "Sum of atomic spin populations:    2.0000000"]
+        out.append("")
+    out += [
+        "Expectation value of <S**2>     :     2.006924",
+        "Ideal value S*(S+1) for S=1.0   :     2.000000",
+        "Deviation                       :     0.006924",
+        "",
+        "Total Dipole Moment    :     -0.000010       0.000020       1.234560",
+        "                        -----------------------------------------",
+        "Magnitude (a.u.)       :      1.234560",
+        "Magnitude (Debye)      :      3.137960",
+        ""]
+    return out
+
+def geo_log(E, cycles=5, kb=64, converged=True, geometry=None):
+    """Gives the text of a geometry optimization log of about kb kilobytes.
+    The properties of the final evaluation are included if the geometry is
+    given.
+    """
+    # Each SCF line is about 60 bytes.
+    pad = max(1, int(kb*1024 / 60 / (cycles + 1)))
+    out = ["                         * Geometry Optimization Run *"]
+    for c in range(1, cycles + 1):
+        Ec = E + 0.001*(cycles - c)
+        out += [
+            "                         *************************************"
+            "************************",
+            "                         *                GEOMETRY OPTIMIZATION "
+            "CYCLE %3d            *" % c,
+            "                         *************************************"
+            "************************"]
+        out += scf_block(Ec, pad)
+        out += ["", "FINAL SINGLE POINT ENERGY      %.12f" % Ec, ""]
+        out += [
+            "                                .--------------------.",
+            "          ----------------------|Geometry convergence|"
+            "-------------------------",
+            "          Item                value                   "
+            "Tolerance       Converged",
+            "          ------------------------------------------------"
+            "---------------------",
+            "          Energy change      %.7f              0.0000050      NO"
+            % (-0.001/c),
+            "          RMS gradient        %.7f              0.0001000      NO"
+            % (0.01/c),
+            "          MAX gradient        %.7f              0.0003000      NO"
+            % (0.02/c),
+            "          RMS step            %.7f              0.0020000      NO"
+            % (0.03/c),
+            "          MAX step            %.7f              0.0040000      NO"
+            % (0.04/c),
+            "          ------------------------------------------------"
+            "---------------------"]
+    if not converged:
+        out += ["", "                              WARNING!!!!!!!",
+                "The optimization did not converge but reached the maximum "
+                "number of optimization cycles."]
+    out += ["", "                             ***  FINAL ENERGY EVALUATION AT "
+            "THE STATIONARY POINT  ***", ""]
+    out += scf_block(E, pad)
+    out += ["", "FINAL SINGLE POINT ENERGY      %.12f" % E, ""]
+    if geometry is not None:
+        out += properties_block(geometry)
+    out += ["                                *** OPTIMIZATION RUN DONE ***",
+            "",
+            "                             ****ORCA TERMINATED NORMALLY****",
+            "TOTAL RUN TIME: 0 days 0 hours 12 minutes 5 seconds 123 msec"]
+    return "\n".join(out) + "\n"
+
+def freq_log(E, natoms=8, kb=256, imaginary=False, linear=False):
+    """Gives the text of a frequency calculation log of about kb kilobytes,
+    with the vibrational, normal mode, IR and thermochemistry blocks.
+    """
+    nmodes = 3*natoms
+    first = 5 if linear else 6
+    freqs = [0.0]*first + [
+        50.0 + 3000.0*i/nmodes for i in range(nmodes - first)]
+    if imaginary:
+        freqs[first] = -55.5
+    
+    # As in ORCA, the energy is printed once, before the frequency blocks.
+    out = scf_block(E, max(1, int(kb*1024 / 60)))
+    out += ["", "FINAL SINGLE POINT ENERGY      %.12f" % E, ""]
+    out += ["", "-----------------------", "VIBRATIONAL FREQUENCIES",
+            "-----------------------", ""]
+    out += ["%4d:  %11.2f cm**-1" % (i, f) for i, f in enumerate(freqs)]
+    out += ["", "", "------------", "NORMAL MODES", "------------", "",
+            "These modes are the cartesian displacements weighted by the "
+            "diagonal matrix",
+            "M(i,i)=1/sqrt(m[i]) where m[i] is the mass of the displaced atom",
+            "Thus, these vectors are normalized but *not* orthogonal", ""]
+    for start in range(0, nmodes, 6):
+        cols = range(start, min(start + 6, nmodes))
+        out.append("      " + "".join("%11d" % c for c in cols))
+        for r in range(nmodes):
+            out.append("%6d  " % r + "".join(
+                        "%11.6f" % (((r*7 + c*3) % 17 - 8)/20.0) for c in cols))
+    out += ["", "", "-----------", "IR SPECTRUM", "-----------", "",
+            " Mode    freq (cm**-1)   T**2         TX         TY         TZ",
+            "------------------------------------------------------------"
+            "-------"]
+    for i in range(first, nmodes):
+        out.append("%4d:  %11.2f   %10.6f  ( %9.6f %9.6f %9.6f)" % (
+                    i, freqs[i], (i % 7)*1.3, 0.1, -0.1, 0.05))
+    out += ["", "--------------------------", "THERMOCHEMISTRY AT 298.15K",
+            "--------------------------", "",
+            "Temperature         ... 298.15 K",
+            "Pressure            ... 1.00 atm",
+            "Total Mass          ... %.2f AMU" % (natoms*20.0), ""]
+    
+    # The thermochemistry block, with values at the offsets ORCA uses.
+    therm = [""]*70
+    therm[0] = "INNER ENERGY"
+    therm[1] = "------------"
+    therm[19] = ("Total thermal energy                    %.8f Eh"
+                    % (E + 0.05))
+    therm[39] = ("Total Enthalpy                    ...   %.8f Eh"
+                    % (E + 0.06))
+    therm[54] = ("Electronic entropy                ...      0.00000000 Eh"
+                    "      0.00 kcal/mol")
+    therm[55] = ("Vibrational entropy               ...      0.01234567 Eh"
+                    "      7.75 kcal/mol")
+    therm[57] = ("Translational entropy             ...      0.02000000 Eh"
+                    "     12.55 kcal/mol")
+    therm[62] = ("Rotational constants in cm-1: %12.6f %12.6f %12.6f"
+                    % (0.0, 0.5, 0.5) if linear else
+                 "Rotational constants in cm-1: %12.6f %12.6f %12.6f"
+                    % (0.05, 0.04, 0.03))
+    therm[65] = ("  linear molecule" if linear else "  nonlinear molecule")
+    therm[68] = "qrot = %.3f" % (12345.678 + natoms)
+    out += therm
+    out += ["",
+            "                             ****ORCA TERMINATED NORMALLY****",
+            "TOTAL RUN TIME: 0 days 2 hours 12 minutes 5 seconds 123 msec"]
+    return "\n".join(out) + "\n"
+
+def xyz(atoms):
+    """Gives the text of an aligned .xyz file for a list of (elem, x, y, z).
+    """
+    text = "%d\n\n" % len(atoms)
+    for atom in atoms:
+        text += "%-3s%15.9f%15.9f%15.9f\n" % atom
+    return text
+
+def atoms(metal, ligand, nN):
+    """Gives a paddlewheel-like M2(L)4 geometry along z, with nN nitrogen
+    atoms stacked above it.
+    """
+    geometry = [(metal, 0.0, 0.0, 0.0), (metal, 0.0, 0.0, 2.2)]
+    for k in range(4):
+        x, y = [(1.5, 0), (-1.5, 0), (0, 1.5), (0, -1.5)][k]
+        geometry.append((ligand[0], x, y, 0.1))
+        geometry.append((ligand[1], x, y, 2.1))
+    z = 2.2
+    for n in range(nN):
+        z += 1.7 if n == 0 else 1.1
+        geometry.append(('N', 0.0, 0.0, z))
+    return geometry
+
+def structure_names(count):
+    """Gives count (name, metal, ligand, nN) tuples, cycling through the
+    metal, ligand and nitrogen families, and numbering the ligands once they
+    have all been used.
+    """
+    names = []
+    per_round = len(metals)*len(ligands)*len(families)
+    for i in range(count):
+        variant = i // per_round
+        j = i % per_round
+        metal = metals[j // (len(ligands)*len(families))]
+        ligand = ligands[(j // len(families)) % len(ligands)]
+        suffix, nN = families[j % len(families)]
+        tag = "v%d" % variant if variant else ""
+        names.append(
+            ("%s2%s%s%s" % (metal, ligand, tag, suffix), metal, ligand, nN))
+    return names
+
+def make_campaign(root, count=1000, geo_kb=64, freq_kb=256, states='ST',
+                    seed=0):
+    """Writes a synthetic campaign of count structures under root, including
+    the N2 reference structure. Returns the total bytes written.
+    """
+    rng = random.Random(seed)
+    total = 0
+    entries = structure_names(count)
+    entries.append(("N2", None, None, 2))
+    
+    for name, metal, ligand, nN in entries:
+        path = os.path.join(root, name)
+        os.makedirs(path, exist_ok=True)
+        if metal is None:
+            geometry = [('N', 0.0, 0.0, 0.0), ('N', 0.0, 0.0, 1.1)]
+            spins = 'S'
+        else:
+            geometry = atoms(metal, ligand, nN)
+            spins = states
+        
+        energies = {s: -100.0*(1 + nN) - rng.random() for s in spins}
+        ground = min(energies, key=energies.get)
+        files = {}
+        for s, E in energies.items():
+            files["%s_1%sgeo.log" % (name, s)] = geo_log(
+                        E, kb=geo_kb, geometry=geometry)
+            files["%s_1%sgeo.xyz" % (name, s)] = xyz(geometry)
+        files["%s_1%sfreq.log" % (name, ground)] = freq_log(
+                    energies[ground], len(geometry), freq_kb,
+                    linear=metal is None)
+        for file, text in files.items():
+            with open(os.path.join(path, file), "wt") as f:
+                f.write(text)
+            total += len(text)
+    
+    return total
+
+def make_filegen(root, metals_out=5, ligands_out=5):
+    """Writes a filegen template directory and guide file (guide.py) under
+    root, for a metal x ligand sweep. Returns the guide module name.
+    """
+    template = os.path.join(root, "Cr2OO4")
+    os.makedirs(template, exist_ok=True)
+    lines = ["! B3LYP def2-TZVP Opt", "%pal nprocs 8 end",
+                "* xyzfile 0 1 Cr2OO4_1Sgeo.xyz", ""]
+    lines += ["# Cr OO line %d" % i for i in range(200)]
+    inp = "\n".join(lines)
+    with open(os.path.join(template, "Cr2OO4_1Sgeo.inp"), "wt") as f:
+        f.write(inp + "\n")
+    with open(os.path.join(template, "Cr2OO4_1Sgeo.xyz"), "wt") as f:
+        f.write(xyz(atoms('Cr', 'OO', 0)))
+    
+    guide = {
+        'Cr': metals[1:1 + metals_out],
+        'OO': ligands[1:1 + ligands_out]}
+    with open(os.path.join(root, "guide.py"), "wt") as f:
+        f.write("dirs = ['Cr2OO4']\n")
+        f.write("multi_repl = %r\n" % guide)
+    return "guide"
+
+if __name__ == "__main__":
+    import sys
+    root = sys.argv[1]
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    size = make_campaign(root, count)
+    print("Wrote %d structures (%.1f MB) to %s." % (count, size/2**20, root))
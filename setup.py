@@ -8,8 +8,14 @@ setup(name='whaler',
                         "ORCA."),
     url = 'https://github.com/tristanbrown/whaler',
     license = "MIT",
-    packages = find_packages(),
+    packages = find_packages(exclude=['benchmarks', 'test']),
     install_requires = ['numpy', 'pandas'],
+    extras_require = {
+        'parquet': ['pyarrow'],
+        'feather': ['pyarrow'],
+        'hdf5': ['tables'],
+        'zstd': ['zstandard'],
+    },
     entry_points = {
         'console_scripts': [
             'whaler = whaler.__main__:main'
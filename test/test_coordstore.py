@@ -0,0 +1,101 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from benchmarks import synthetic
+from whaler.dataprep import CoordStore
+
+
+def reader(file, path):
+    """Reads the element labels and coordinates of an .xyz file.
+    """
+    with open(os.path.join(path, file)) as f:
+        rows = [line.split() for line in f.readlines()[2:] if line.strip()]
+    return ([row[0] for row in rows],
+            np.array([row[1:] for row in rows], dtype=float))
+
+
+class CoordStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.dirs = {}
+        self.geometries = {}
+        self.write('Cr2OO4', 'Cr2OO4_1Sgeo.xyz', synthetic.atoms('Cr', 'OO', 0))
+        self.write('Cr2OO4', 'Cr2OO4_1Tgeo.xyz', [
+                    (e, x, y - 0.25, z) for e, x, y, z in
+                    synthetic.atoms('Cr', 'OO', 0)])
+        self.write('Mo2NN4N2', 'Mo2NN4N2_1Tgeo.xyz',
+                    synthetic.atoms('Mo', 'NN', 2))
+    
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+    
+    def write(self, struct, file, atoms, mtime=None):
+        path = os.path.join(self.dir, struct)
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, file), 'w') as f:
+            f.write(synthetic.xyz(atoms))
+        if mtime is not None:
+            os.utime(os.path.join(path, file), ns=(mtime, mtime))
+        self.dirs[struct] = path
+        self.geometries[file] = atoms
+    
+    def store(self):
+        return CoordStore('coords', self.dir)
+    
+    def check(self, store):
+        for key in store.index:
+            struct, label = key.split(':')
+            file = '%s_1%s.xyz' % (struct, label)
+            expected = self.geometries[file]
+            found, elems, coords = store.get(struct, label[0], label[1:])
+            self.assertEqual(found, file)
+            self.assertEqual(list(elems), [atom[0] for atom in expected])
+            np.testing.assert_allclose(
+                coords, [atom[1:] for atom in expected], atol=1e-9)
+    
+    def test_append_compact_load(self):
+        store = self.store()
+        store.refresh(self.dirs, reader)
+        self.assertEqual(len(store.index), 3)
+        self.assertEqual(store.stale_rows(), 0)
+        self.check(store)
+        
+        # A changed geometry is appended, leaving its old rows stale.
+        moved = [(e, x + 0.5, y, z) for e, x, y, z in
+                    synthetic.atoms('Cr', 'OO', 0)]
+        self.write('Cr2OO4', 'Cr2OO4_1Sgeo.xyz', moved, mtime=10**18)
+        store.refresh(self.dirs, reader)
+        self.assertEqual(store.stale_rows(), len(moved))
+        self.check(store)
+        
+        store.compact()
+        self.assertEqual(store.stale_rows(), 0)
+        self.assertEqual(os.path.getsize(store.datafile), 24*store.rows)
+        self.check(store)
+        self.check(self.store())
+    
+    def test_removed(self):
+        store = self.store()
+        store.refresh(self.dirs, reader)
+        os.remove(os.path.join(self.dirs['Cr2OO4'], 'Cr2OO4_1Tgeo.xyz'))
+        store.refresh(self.dirs, reader)
+        self.assertIsNone(store.get('Cr2OO4', 'T', 'geo'))
+        self.check(self.store())
+    
+    def test_mismatched_index(self):
+        # An index that does not match the data file is discarded, and the
+        # geometries are read again.
+        store = self.store()
+        store.refresh(self.dirs, reader)
+        with open(store.datafile, 'ab') as f:
+            f.write(np.zeros(3).tobytes())
+        store = self.store()
+        self.assertEqual(store.index, {})
+        store.refresh(self.dirs, reader)
+        self.assertEqual(len(store.index), 3)
+        self.check(store)
+        self.check(self.store())
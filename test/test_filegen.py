@@ -0,0 +1,97 @@
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from benchmarks import synthetic
+from whaler.filegen import Generator
+
+
+class GeneratorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.dir = tempfile.mkdtemp()
+        self.guide = synthetic.make_filegen(self.dir, 2, 2)
+        os.chdir(self.dir)
+    
+    def tearDown(self):
+        os.chdir(self.cwd)
+        sys.modules.pop(self.guide, None)
+        if self.dir in sys.path:
+            sys.path.remove(self.dir)
+        shutil.rmtree(self.dir)
+    
+    def run_generator(self, dry_run=False):
+        """Runs the generator, returning its printed lines.
+        """
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            Generator(self.guide, dry_run).run()
+        return out.getvalue().splitlines()
+    
+    def outputs(self):
+        """Gives the mtime of every generated file.
+        """
+        mtimes = {}
+        for dir in os.listdir(self.dir):
+            if dir == 'Cr2OO4' or not os.path.isdir(dir):
+                continue
+            for file in os.listdir(dir):
+                path = os.path.join(dir, file)
+                mtimes[path] = os.stat(path).st_mtime_ns
+        return mtimes
+    
+    def test_create(self):
+        lines = self.run_generator()
+        self.assertEqual(lines[-1], "Wrote 8 files; 0 unchanged.")
+        self.assertEqual(len(self.outputs()), 8)
+        with open(os.path.join('Mo2OO4', 'Mo2OO4_1Sgeo.inp')) as f:
+            self.assertIn('* xyzfile 0 1 Mo2OO4_1Sgeo.xyz', f.read())
+        self.assertTrue(os.path.exists('.whaler_manifest.json'))
+    
+    def test_unchanged(self):
+        self.run_generator()
+        before = self.outputs()
+        lines = self.run_generator()
+        self.assertEqual(lines[-1], "Wrote 0 files; 8 unchanged.")
+        self.assertFalse([line for line in lines if line.startswith('Writing')])
+        self.assertEqual(self.outputs(), before)
+    
+    def test_modified(self):
+        self.run_generator()
+        path = os.path.join('Mo2OO4', 'Mo2OO4_1Sgeo.inp')
+        with open(path) as f:
+            text = f.read()
+        with open(path, 'w') as f:
+            f.write('edited\n')
+        before = self.outputs()
+        
+        lines = self.run_generator()
+        self.assertEqual(lines[-1], "Wrote 1 files; 7 unchanged.")
+        with open(path) as f:
+            self.assertEqual(f.read(), text)
+        after = self.outputs()
+        del before[path], after[path]
+        self.assertEqual(after, before)
+    
+    def test_dry_run(self):
+        self.run_generator()
+        os.remove(os.path.join('W2OO4', 'W2OO4_1Sgeo.xyz'))
+        path = os.path.join('Mo2OO4', 'Mo2OO4_1Sgeo.inp')
+        with open(path, 'w') as f:
+            f.write('edited\n')
+        before = self.outputs()
+        with open('.whaler_manifest.json') as f:
+            manifest = f.read()
+        
+        lines = self.run_generator(dry_run=True)
+        self.assertEqual(
+            lines[-1], "Dry run: 1 to create, 1 to update, 6 unchanged.")
+        self.assertEqual(self.outputs(), before)
+        with open(path) as f:
+            self.assertEqual(f.read(), 'edited\n')
+        with open('.whaler_manifest.json') as f:
+            self.assertEqual(f.read(), manifest)
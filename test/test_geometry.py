@@ -0,0 +1,58 @@
+import unittest
+
+import numpy as np
+
+from benchmarks import synthetic
+from whaler import geometry
+
+
+def rotation(angle, axis):
+    """Gives the matrix of a rotation by angle (radians) about an axis.
+    """
+    axis = np.asarray(axis, dtype=float)/np.linalg.norm(axis)
+    K = np.array([
+        [0, -axis[2], axis[1]], [axis[2], 0, -axis[0]],
+        [-axis[1], axis[0], 0]])
+    return np.eye(3) + np.sin(angle)*K + (1 - np.cos(angle))*K.dot(K)
+
+
+class GeometryTestCase(unittest.TestCase):
+    def setUp(self):
+        atoms = synthetic.atoms('Cr', 'ON', 2)
+        self.coords = np.array([atom[1:] for atom in atoms])
+        self.coords[2] += [0.3, 0.2, 0.1]
+        self.rotated = (self.coords.dot(rotation(1.1, [1, 2, 3]).T)
+                            + [4.0, -1.0, 2.5])
+    
+    def test_rotated_copy(self):
+        rmsd = geometry.kabsch_rmsd([self.coords], [self.rotated])
+        self.assertAlmostEqual(rmsd[0], 0, places=6)
+    
+    def test_displaced_atom(self):
+        moved = self.coords.copy()
+        moved[0, 0] += 0.5
+        rmsd = geometry.kabsch_rmsd([self.coords], [moved])
+        self.assertGreater(rmsd[0], 0.01)
+        self.assertLess(rmsd[0], 0.5/np.sqrt(len(moved)))
+    
+    def test_mirror_image(self):
+        # Reflections are not allowed, so a chiral structure is distinct
+        # from its mirror image.
+        mirrored = self.coords*[1, 1, -1]
+        rmsd = geometry.kabsch_rmsd([self.coords], [mirrored])
+        self.assertGreater(rmsd[0], 0.01)
+    
+    def test_fingerprints(self):
+        fps = geometry.fingerprints([self.coords, self.rotated])
+        np.testing.assert_allclose(fps[0], fps[1], atol=1e-9)
+    
+    def test_cluster(self):
+        distinct = self.coords.copy()
+        distinct[-1, 2] += 1.0
+        coords = [self.coords, distinct, self.rotated]
+        leaders, rmsds = geometry.cluster(coords, 0.1)
+        self.assertEqual(list(leaders), [0, 1, 0])
+        self.assertAlmostEqual(rmsds[2], 0, places=6)
+        
+        leaders, rmsds = geometry.cluster(coords, 0.1, priority=[2, 1, 0])
+        self.assertEqual(list(leaders), [2, 1, 2])
@@ -0,0 +1,145 @@
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from benchmarks import synthetic
+from whaler.dataprep import LogScan
+from whaler.dataprep import ParseCache
+
+
+class LogScanTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.geometry = synthetic.atoms('Cr', 'OO', 2)
+        self.write('Cr2OO4N2_1Tgeo.log', synthetic.geo_log(
+            -100.5, kb=4, geometry=self.geometry))
+        self.write('Cr2OO4N2_1Sgeo.log', synthetic.geo_log(
+            -100.4, kb=4, converged=False))
+        self.write('Cr2OO4N2_1Tfreq.log', synthetic.freq_log(
+            -100.5, natoms=len(self.geometry), kb=4))
+        with gzip.open(os.path.join(self.dir, 'Cr2OO4N2_2Tgeo.log.gz'),
+                        'wt') as f:
+            f.write(synthetic.geo_log(-100.6, kb=4))
+    
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+    
+    def write(self, file, text):
+        with open(os.path.join(self.dir, file), 'w') as f:
+            f.write(text)
+    
+    def scan(self, file):
+        return LogScan(file, self.dir)
+    
+    def test_geo(self):
+        scan = self.scan('Cr2OO4N2_1Tgeo.log')
+        self.assertEqual(scan.status, 'normal')
+        self.assertAlmostEqual(scan.energy, -100.5)
+        self.assertTrue(scan.optdone)
+        self.assertFalse(scan.optwarning)
+    
+    def test_compressed(self):
+        scan = self.scan('Cr2OO4N2_2Tgeo.log.gz')
+        self.assertEqual(scan.status, 'normal')
+        self.assertAlmostEqual(scan.energy, -100.6)
+        self.assertTrue(scan.optdone)
+        self.assertEqual(len(list(scan.cycles())), 5)
+    
+    def test_unconverged(self):
+        scan = self.scan('Cr2OO4N2_1Sgeo.log')
+        self.assertEqual(scan.status, 'normal')
+        self.assertTrue(scan.optwarning)
+    
+    def test_freq(self):
+        scan = self.scan('Cr2OO4N2_1Tfreq.log')
+        self.assertEqual(len(scan.frequencies), 3*len(self.geometry))
+        self.assertAlmostEqual(scan.temperature, 298.15)
+        self.assertAlmostEqual(scan.pressure, 1.0)
+        self.assertFalse(scan.optdone)
+    
+    def test_freq_energy(self):
+        # The energy is printed before the frequency blocks, which outgrow
+        # the tail searched for it in large molecules.
+        scan = self.scan('Cr2OO4N2_1Tfreq.log')
+        scan.tail_bytes = 1024
+        self.assertTrue(np.isnan(scan.energy))
+        scan = self.scan('Cr2OO4N2_1Tfreq.log')
+        scan.tail_bytes = 1024
+        self.assertEqual(len(scan.frequencies), 3*len(self.geometry))
+        self.assertAlmostEqual(scan.energy, -100.5)
+    
+    def test_properties(self):
+        values = self.scan('Cr2OO4N2_1Tgeo.log').properties()
+        self.assertEqual(
+            sorted(values), ['dipole', 'loewdin', 'mulliken', 's2'])
+        mulliken = values['mulliken']
+        self.assertEqual(mulliken['columns'], ['charge', 'spin'])
+        self.assertEqual(
+            mulliken['elements'], [atom[0] for atom in self.geometry])
+        self.assertAlmostEqual(values['dipole']['values'][0][3], 3.13796)
+        self.assertEqual(values['s2']['values'], [[2.006924, 2.0]])
+    
+    def test_some_properties(self):
+        scan = self.scan('Cr2OO4N2_1Sgeo.log')
+        self.assertEqual(scan.properties(), {})
+        scan = self.scan('Cr2OO4N2_1Tgeo.log')
+        self.assertEqual(list(scan.properties(['s2'])), ['s2'])
+
+
+class ParseCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.log = os.path.join(self.dir, 'A_1Sgeo.log')
+        with open(self.log, 'w') as f:
+            f.write(synthetic.geo_log(-1.0, kb=1))
+    
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+    
+    def cache(self):
+        return ParseCache('cache.json', self.dir, bulky=('traj',))
+    
+    def test_reuse(self):
+        cache = self.cache()
+        sig = cache.signature(self.log)
+        cache.put(self.log, 'energy', sig, True, -1.0)
+        cache.save()
+        cache = self.cache()
+        self.assertEqual(cache.get(self.log, 'energy', sig), (True, -1.0))
+        self.assertIsNone(cache.get(self.log, 'energy', [0, 0]))
+    
+    def test_bulky(self):
+        cache = self.cache()
+        sig = cache.signature(self.log)
+        cache.put(self.log, 'energy', sig, True, -1.0)
+        cache.put(self.log, 'traj', sig, True, [1.0, 2.0])
+        cache.save()
+        self.assertTrue(os.path.exists(cache.shelf('traj')))
+        with open(cache.fn) as f:
+            self.assertNotIn('traj', f.read())
+        self.assertEqual(
+            self.cache().get(self.log, 'traj', sig), (True, [1.0, 2.0]))
+    
+    def test_versions(self):
+        cache = self.cache()
+        sig = cache.signature(self.log)
+        cache.put(self.log, 'traj:a', sig, True, [1.0])
+        cache.save()
+        cache = self.cache()
+        self.assertIsNone(cache.get(self.log, 'traj:a,b', sig))
+        self.assertIsNone(cache.get(self.log, 'traj:a', sig))
+    
+    def test_clear(self):
+        cache = self.cache()
+        sig = cache.signature(self.log)
+        cache.put(self.log, 'traj', sig, True, [1.0])
+        cache.save()
+        cache = self.cache()
+        cache.clear()
+        cache.save()
+        self.assertFalse(os.path.exists(cache.shelf('traj')))
+        self.assertIsNone(self.cache().get(self.log, 'traj', sig))
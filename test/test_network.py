@@ -0,0 +1,49 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from whaler.network import Network
+
+
+class NetworkTestCase(unittest.TestCase):
+    def setUp(self):
+        self.reactions = {
+            'Add N2' : {'{}N2':1, '{}':-1, 'N2':-1},
+            'Add N' : {'{}N':1, '{}':-1, 'N2':-0.5}}
+        self.energies = pd.Series(
+            {'A':-10.0, 'AN':-12.0, 'AN2':-13.5, 'B':-20.0, 'BN':-21.0,
+             'N2':-3.0})
+        self.network = Network(
+            self.reactions, self.energies.index, bases=['A', 'B'])
+    
+    def test_evaluate(self):
+        results = self.network.evaluate(self.energies)
+        self.assertEqual(list(results.columns), ['Add N2', 'Add N'])
+        self.assertAlmostEqual(results.loc['A', 'Add N2'], -0.5)
+        self.assertAlmostEqual(results.loc['A', 'Add N'], -0.5)
+        self.assertAlmostEqual(results.loc['B', 'Add N'], 0.5)
+    
+    def test_missing_species(self):
+        # BN2 was never calculated, and C is not in the network at all.
+        results = self.network.evaluate(self.energies)
+        self.assertTrue(np.isnan(results.loc['B', 'Add N2']))
+        network = Network(
+            self.reactions, self.energies.index, bases=['A', 'C'])
+        results = network.evaluate(self.energies)
+        self.assertTrue(results.loc['C'].isna().all())
+        self.assertFalse(results.loc['A'].isna().any())
+    
+    def test_nan_species(self):
+        energies = self.energies.copy()
+        energies['AN'] = np.nan
+        results = self.network.evaluate(energies)
+        self.assertTrue(np.isnan(results.loc['A', 'Add N']))
+        self.assertAlmostEqual(results.loc['A', 'Add N2'], -0.5)
+    
+    def test_evaluate_array(self):
+        # Further axes, such as temperatures, are carried through.
+        values = np.stack([self.energies.values, 2*self.energies.values], 1)
+        results = self.network.evaluate_array(values)
+        self.assertEqual(results.shape, (2, 2, 2))
+        self.assertAlmostEqual(results[0, 0, 1], -1.0)
@@ -0,0 +1,66 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from benchmarks import synthetic
+from whaler import config
+from whaler.analysis import Analysis
+
+
+class TableFormatTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.saved = (dict(config.path), dict(config.analysis))
+        config.path.update({'input':self.dir, 'output':self.dir})
+        config.analysis['cache'] = None
+        
+        # A has finished logs; B's only log stops mid-run.
+        self.write('A', 'A_1Sgeo.log', synthetic.geo_log(-10.0, kb=1))
+        self.write('A', 'A_1Tgeo.log', synthetic.geo_log(-10.2, kb=1))
+        self.write('B', 'B_1Sgeo.log', synthetic.geo_log(-20.0, kb=1)[:500])
+    
+    def tearDown(self):
+        config.path.clear()
+        config.path.update(self.saved[0])
+        config.analysis.clear()
+        config.analysis.update(self.saved[1])
+        shutil.rmtree(self.dir)
+    
+    def write(self, struct, file, text):
+        os.makedirs(os.path.join(self.dir, struct), exist_ok=True)
+        with open(os.path.join(self.dir, struct, file), 'w') as f:
+            f.write(text)
+    
+    def round_trip(self, format):
+        config.analysis['format'] = format
+        A = Analysis()
+        A.write_table(A.gEs, A.gs_out)
+        return A.read_table(A.gs_out)
+    
+    def check(self, gEs):
+        self.assertEqual(gEs.loc['A', 'Ground State'], 'T')
+        self.assertTrue(gEs['Ground State'].isna()['B'])
+        self.assertEqual(list(gEs.dropna(how='all').index), ['A'])
+    
+    def test_schema(self):
+        A = Analysis()
+        self.check(A.schema(A.gEs))
+    
+    def test_parquet(self):
+        try:
+            import pyarrow
+        except ImportError:
+            self.skipTest("pyarrow is not installed")
+        self.check(self.round_trip('parquet'))
+        self.check(self.round_trip('feather'))
+    
+    def test_hdf5(self):
+        try:
+            import tables
+        except ImportError:
+            self.skipTest("PyTables is not installed")
+        self.check(self.round_trip('hdf5'))
+    
+    def test_csv(self):
+        self.check(self.round_trip('csv'))
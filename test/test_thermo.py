@@ -0,0 +1,51 @@
+import unittest
+
+import numpy as np
+
+from whaler import thermo
+
+# Physical constants (CODATA 2018), in SI units, and the hartree in J.
+h = 6.62607015e-34
+c = 2.99792458e10
+k = 1.380649e-23
+Eh = 4.3597447222071e-18
+
+
+class VibrationalTestCase(unittest.TestCase):
+    def setUp(self):
+        self.freqs = np.array([[150.0, 800.0, 3100.0], [400.0, np.nan, np.nan]])
+        self.T = np.array([100.0, 298.15, 1000.0])
+    
+    def closed_form(self, nu, T):
+        """Harmonic oscillator entropy, in Eh/K, of a single mode.
+        """
+        x = h*c*nu/(k*T)
+        return k/Eh*(x/np.expm1(x) - np.log(1 - np.exp(-x)))
+    
+    def test_entropy(self):
+        zpe, e_vib, s_vib = thermo.vibrational(self.freqs, self.T)
+        self.assertEqual(s_vib.shape, (2, 3))
+        for i, T in enumerate(self.T):
+            expected = sum(self.closed_form(nu, T) for nu in self.freqs[0])
+            self.assertAlmostEqual(s_vib[0, i]/expected, 1, places=6)
+            expected = self.closed_form(400.0, T)
+            self.assertAlmostEqual(s_vib[1, i]/expected, 1, places=6)
+    
+    def test_zero_point(self):
+        zpe, e_vib, s_vib = thermo.vibrational(self.freqs, self.T)
+        expected = 0.5*h*c*np.nansum(self.freqs, axis=1)/Eh
+        np.testing.assert_allclose(zpe, expected, rtol=1e-6)
+    
+    def test_qrrho(self):
+        # Stiff modes are left harmonic, and soft ones lose entropy to the
+        # damped free rotor.
+        freqs = np.array([[3000.0], [10.0]])
+        harmonic = thermo.vibrational(freqs, self.T)[2]
+        damped = thermo.vibrational(freqs, self.T, qrrho=100)[2]
+        np.testing.assert_allclose(damped[0], harmonic[0], atol=1e-10)
+        self.assertTrue((damped[1] < harmonic[1]).all())
+    
+    def test_pad(self):
+        array = thermo.pad([[1.0, 2.0], [3.0]])
+        self.assertEqual(array.shape, (2, 2))
+        self.assertTrue(np.isnan(array[1, 1]))
@@ -0,0 +1,54 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from benchmarks import synthetic
+from whaler import config
+from whaler.analysis import Analysis
+from whaler.watch import Watcher
+
+
+class WatcherTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.saved = (dict(config.path), dict(config.analysis))
+        config.path.update({'input':self.dir, 'output':self.dir})
+        config.analysis['cache'] = None
+        
+        # A has finished; B's triplet is still running, and its first singlet
+        # was superseded.
+        self.write('A', 'A_1Sgeo.log', synthetic.geo_log(-10.0, kb=1))
+        self.write('A', 'A_1Tgeo.log', synthetic.geo_log(-10.2, kb=1))
+        self.write('B', 'B_1Sgeo.log', synthetic.geo_log(-20.0, kb=1)[:500])
+        self.write('B', 'B_2Sgeo.log', synthetic.geo_log(-20.1, kb=1))
+        self.write('B', 'B_1Tgeo.log', synthetic.geo_log(-20.2, kb=1)[:500])
+        self.watcher = Watcher(Analysis(), write=False)
+    
+    def tearDown(self):
+        config.path.clear()
+        config.path.update(self.saved[0])
+        config.analysis.clear()
+        config.analysis.update(self.saved[1])
+        shutil.rmtree(self.dir)
+    
+    def write(self, struct, file, text):
+        os.makedirs(os.path.join(self.dir, struct), exist_ok=True)
+        with open(os.path.join(self.dir, struct, file), 'w') as f:
+            f.write(text)
+    
+    def pending(self):
+        return sorted(os.path.basename(p) for p in self.watcher.pending)
+    
+    def test_pending(self):
+        # Without a parse cache, only the running log is checked every poll.
+        changed = self.watcher.poll()
+        self.assertEqual(changed['gs'], {'A', 'B'})
+        self.assertEqual(self.pending(), ['B_1Tgeo.log'])
+        self.assertEqual(self.watcher.poll()['gs'], set())
+        
+        self.write('B', 'B_1Tgeo.log', synthetic.geo_log(-20.2, kb=1))
+        os.utime(os.path.join(self.dir, 'B', 'B_1Tgeo.log'), ns=(1, 1))
+        self.assertEqual(self.watcher.poll()['gs'], {'B'})
+        self.assertEqual(self.pending(), [])
+        self.assertEqual(self.watcher.A.gEs.loc['B', 'Ground State'], 'T')
@@ -1,12 +1,101 @@
 """
-Main routine of whaler. 
+Main routine of whaler. Each subcommand imports the modules it needs only when
+it runs, so that light commands (filegen, --help) do not pay for loading numpy
+and pandas.
 """
 
+import os
 import sys
 from whaler import config
-from whaler import analysis
-from whaler import filegen
-from whaler import custom
+from whaler.profiling import profile
+
+usage = """Usage: whaler <command> [options]
+
+Commands:
+{commands}
+
+Options:
+    --refresh     parse every log again, ignoring cached values
+    --jobs N      scan the structure directories with N processes
+    --only PAT    analyse only the structures matching the comma-separated
+                  globs (or 're:' regular expressions) in PAT
+    --profile     report where the command spent its time
+    --dry-run     (filegen) list the files that would be written
+    --help        show this message"""
+
+def analysis(opts):
+    from whaler.analysis import Analysis
+    return Analysis(opts['refresh'], opts['jobs'], opts['only'])
+
+def reactions(opts):
+    from whaler.custom import Reactions
+    return Reactions(opts['refresh'], opts['jobs'], opts['only'])
+
+def gs(args, opts):
+    analysis(opts).write_data("gs")
+
+def freqinp(args, opts):
+    analysis(opts).write_inp_all("freq", "freqsample.inp")
+
+def singleinp(args, opts):
+    analysis(opts).write_inp_all("single", "singlesample.inp")
+
+def thermo(args, opts):
+    analysis(opts).write_data("thermo")
+
+def traj(args, opts):
+    analysis(opts).write_data("traj")
+
+def props(args, opts):
+    analysis(opts).write_data("props")
+
+def dupes(args, opts):
+    analysis(opts).write_data("dupes")
+
+def watch(args, opts):
+    from whaler.watch import Watcher
+    Watcher(analysis(opts)).run()
+
+def serve(args, opts):
+    from whaler.server import Server
+    Server(reactions(opts)).run()
+
+def filegen(args, opts):
+    from whaler.filegen import Generator
+    guide = [arg for arg in args if not arg.startswith('--')][-1]
+    Generator(guide, '--dry-run' in args).run()
+
+def crudeN2(args, opts):
+    reactions(opts).write_crude_N2()
+
+def N2act(args, opts):
+    reactions(opts).write_N2_act()
+
+def N2bonds(args, opts):
+    reactions(opts).write_N2_bonds()
+
+# Subcommands, with the function that runs each and its description.
+commands = {
+    'gs' : (gs, "tabulate the ground spin state energies"),
+    'freqinp' : (freqinp, "write freq .inp files from converged geometries"),
+    'singleinp' : (singleinp,
+                    "write single point .inp files from converged geometries"),
+    'thermo' : (thermo, "tabulate the thermodynamic values"),
+    'traj' : (traj, "tabulate the cycles of every geometry optimization"),
+    'props' : (props, "tabulate the atomic charges, dipoles and <S**2>"),
+    'dupes' : (dupes, "find optimized geometries that duplicate each other"),
+    'watch' : (watch, "keep the tables up to date as calculations finish"),
+    'serve' : (serve, "answer queries from the campaign held in memory"),
+    'filegen' : (filegen, "generate files from templates and a guide"),
+    'crudeN2' : (crudeN2, "reaction energies from geo.log energies"),
+    'N2act' : (N2act, "reaction free energies from thermodynamic values"),
+    'N2bonds' : (N2bonds, "tabulate the M-M, M-N and N-N bond lengths"),
+    }
+
+def print_help():
+    print(usage.format(commands="\n".join(
+        "    {0:<14}{1}".format(name, desc)
+        for name, (run, desc) in commands.items())))
 
 def main(args=None):
     
@@ -15,34 +104,42 @@ def main(args=None):
     if args is None:
         args = sys.argv[1:]
     
-    # Check for requested analysis or file manipulation. 
+    # Check for options.
     
+    opts = {'refresh':'--refresh' in args, 'jobs':None, 'only':None}
+    if '--jobs' in args:
+        opts['jobs'] = int(args[args.index('--jobs') + 1])
+    if '--only' in args:
+        opts['only'] = args[args.index('--only') + 1].split(',')
+    profiling = '--profile' in args
+    if profiling:
+        profile.enable()
+    
+    # Check for requested analysis or file manipulation.
+    
+    command = next((arg for arg in args if arg in commands), None)
     if len(args) == 0:
         print("No arguments passed.")
-    elif 'gs' in args:
-        A = analysis.Analysis()
-        A.write_data("gs")
-    elif 'freqinp' in args:
-        A = analysis.Analysis()
-        A.write_inp_all("freq", "freqsample.inp")
-    elif 'singleinp' in args:
-        A = analysis.Analysis()
-        A.write_inp_all("single", "singlesample.inp")
-    elif 'thermo' in args:
-        A = analysis.Analysis()
-        A.write_data("thermo")
-    elif 'filegen' in args:
-        gen = filegen.Generator(args[-1])
-        gen.run()
-    elif 'crudeN2' in args:
-        A = custom.Reactions()
-        A.write_crude_N2()
-    elif 'N2act' in args:
-        A = custom.Reactions()
-        A.write_N2_act()
-    elif 'N2bonds' in args:
-        A = custom.Reactions()
-        A.write_N2_bonds()
-        
+        return
+    elif '--help' in args or '-h' in args:
+        print_help()
+        return
+    elif command is None:
+        print("Unknown command: %s" % " ".join(args))
+        print_help()
+        return
+    
+    run, desc = commands[command]
+    run(args, opts)
+    
+    # Report where the time went.
+    
+    if profiling:
+        command = ' '.join(arg for arg in args if arg != '--profile')
+        profile.summary(command, config.profile['top'])
+        report = os.path.join(
+                    config.path.get('output', '.'), config.profile['report'])
+        profile.dump(report, command, config.profile['top'])
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
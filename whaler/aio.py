@@ -0,0 +1,63 @@
+"""
+This module contains the asynchronous scanning backend used on network
+filesystems (NFS, Lustre and the like), where every listdir, stat and open is
+a round trip to a server. Rather than issuing them one after another, the
+scanner keeps a bounded number of them in flight on a pool of threads.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Filesystem types, as given in /proc/mounts, that are served over a network.
+network_types = {
+    'nfs', 'nfs4', 'lustre', 'cifs', 'smb3', 'smbfs', 'gpfs', 'beegfs',
+    'ceph', 'glusterfs', 'fuse.glusterfs', 'fuse.sshfs', 'fuse.cephfs',
+    'panfs', 'afs', 'wekafs'}
+
+def filesystem(path, mounts='/proc/mounts'):
+    """Gives the type of the filesystem holding a path, from the mount point
+    that contains it most closely, or None if it cannot be determined.
+    """
+    path = os.path.realpath(path)
+    best = ''
+    fstype = None
+    try:
+        with open(mounts, "rt") as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                point = fields[1].replace('\\040', ' ')
+                inside = (path == point
+                            or path.startswith(point.rstrip('/') + '/'))
+                if inside and len(point) >= len(best):
+                    best = point
+                    fstype = fields[2]
+    except OSError:
+        return None
+    return fstype
+
+def is_network(path):
+    """Whether a path is on a network filesystem.
+    """
+    return filesystem(path) in network_types
+
+class AsyncScanner():
+    """An object that runs blocking, I/O-bound calls concurrently, with at most
+    limit of them in flight at once. The calls run on a pool of threads, so
+    they must be safe to run alongside each other; the results keep the order
+    of the inputs. No event loop is used, so the scanner also works where one
+    is already running, as in a Jupyter kernel.
+    """
+    def __init__(self, limit=32):
+        self.limit = max(1, int(limit))
+    
+    def map(self, func, items):
+        """Returns [func(item) for item in items], running the calls
+        concurrently.
+        """
+        items = list(items)
+        if len(items) < 2:
+            return [func(item) for item in items]
+        with ThreadPoolExecutor(min(self.limit, len(items))) as pool:
+            return list(pool.map(func, items))
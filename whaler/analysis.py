@@ -2,19 +2,111 @@
  
 """
 import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
 import numpy as np
 import pandas as pd
+from . import aio
+from . import config
+from . import extractors
+from . import geometry
+from . import thermo
+from .profiling import profile
+from .catalog import Catalog
+from .catalog import select
 from .dataprep import IO
+from .dataprep import ParseCache
+from .dataprep import CoordStore
+from .dataprep import strip_compression
 from .dataprep import extract_floats as extr
 from .dataprep import dict_values as dvals
 
+# The Analysis object used by each worker process of a scan. 
+_worker = None
+
+def _init_worker(analysis, profiling=False):
+    """Gives a worker process its own copy of the Analysis.
+    """
+    global _worker
+    _worker = analysis
+    if profiling:
+        profile.enable()
+
+def _run_worker(method, struct):
+    """Runs an Analysis method on one structure in a worker process, returning
+    the result along with any newly cached log values and profile data. 
+    """
+    values = getattr(_worker, method)(struct)
+    if _worker.cache is not None:
+        updates = _worker.cache.drain()
+    else:
+        updates = {}
+    return (values, updates, profile.drain())
+
 class Analysis():
     """
     """
-    def __init__(self):
-        self.loc = os.getcwd()
-        self.structs = next(os.walk('.'))[1]
+    def __init__(self, refresh=False, jobs=None, only=None):
+        # Campaign roots to scan, and the location of the outputs. 
+        roots = config.path.get('input', '.')
+        if isinstance(roots, str):
+            roots = [roots]
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.loc = os.path.abspath(config.path.get('output', '.'))
+        os.makedirs(self.loc, exist_ok=True)
+        
+        # Structure directories, optionally narrowed down to those matching
+        # the given glob (or 're:' regular expression) patterns. Only the
+        # selected directories are listed in the catalog. 
+        with profile.stage('scan'):
+            self.dirs = self.find_structs()
+        self.structs = list(self.dirs)
+        self.only = only
+        if only:
+            self.structs = select(self.structs, only)
+        self._catalog = None
         self.logfile = IO('whaler.log', self.loc)
+        
+        # Index of previously parsed log values. The trajectories, property
+        # tables and frequencies are kept out of the shared index. 
+        cachefile = config.analysis.get('cache')
+        if cachefile:
+            self.cache = ParseCache(
+                cachefile, self.loc,
+                bulky=('opt_trajectory', 'prop_vals', 'thermo_data'))
+            if refresh:
+                print("Clearing cached log values.")
+                self.cache.clear()
+        else:
+            self.cache = None
+        
+        # Packed store of the campaign's coordinates, refreshed on first use.
+        storefile = config.analysis.get('coords')
+        if storefile:
+            self.coordstore = CoordStore(storefile, self.loc)
+        else:
+            self.coordstore = None
+        self.coords_refreshed = False
+        
+        # Number of processes used for scanning. 
+        if jobs is None:
+            jobs = config.analysis.get('jobs', 1)
+        self.jobs = max(1, int(jobs))
+        
+        # Concurrent I/O for campaigns on network filesystems. 
+        io = config.analysis.get('io', 'auto')
+        if io == 'auto':
+            network = any(aio.is_network(root) for root in self.roots)
+            io = 'async' if network else 'sync'
+        if io == 'async':
+            self.scanner = aio.AsyncScanner(config.analysis.get('io_limit', 32))
+        elif io == 'sync':
+            self.scanner = None
+        else:
+            raise ValueError(
+                "Unknown io backend '%s'. Choose from: auto, async, sync."
+                % io)
         self.states = ['S', 'T', 'P', 'D', 'Q']
         self.spinflip = {
             'S' : 'T',
@@ -28,11 +120,93 @@ class Analysis():
         self.statekey = {
             self.states[i]:elnums[i] for i in range(len(elnums))}
         
-        # Analysis output filenames. 
-        self.gs_out = "groundstate_Es.csv"
-        self.crude_out = "cruderxn_Es.csv"
-        self.thermo_out = "thermo_Es.csv"
+        # Output table format and file extension. 
+        self.format = config.analysis.get('format', 'csv')
+        formats = {
+            'csv':'.csv', 'parquet':'.parquet', 'feather':'.feather',
+            'hdf5':'.h5'}
+        try:
+            self.ext = formats[self.format]
+        except KeyError:
+            raise ValueError(
+                "Unknown output format '%s'. Choose from: %s."
+                % (self.format, ", ".join(formats)))
+        
+        # Analysis output filenames. Runs narrowed down with --only write
+        # their own tables, leaving those of the whole campaign in place. 
+        self.gs_out = self.outname("groundstate_Es")
+        self.crude_out = self.outname("cruderxn_Es")
+        self.thermo_out = self.outname("thermo_Es")
+        self.traj_out = self.outname("geo_trajectories")
+        self.props_out = self.outname("properties")
+        self.dupes_out = self.outname("duplicate_geometries")
+        
+    def find_structs(self):
+        """Lists the structure directories of every campaign root, scanning
+        the roots concurrently. A structure found in more than one root is
+        taken from the root holding its newest log. Returns a struct:path
+        dictionary, in the order the structures were found.
+        """
+        if len(self.roots) == 1:
+            listings = [self.list_root(self.roots[0])]
+        else:
+            with ThreadPoolExecutor(len(self.roots)) as pool:
+                listings = list(pool.map(self.list_root, self.roots))
+        
+        found = {}
+        for listing in listings:
+            for struct, path in listing:
+                found.setdefault(struct, []).append(path)
         
+        return {
+            struct : paths[0] if len(paths) == 1 else self.newest(paths)
+            for struct, paths in found.items()}
+    
+    def list_root(self, root):
+        """Gives the (struct, path) pairs of the directories in a campaign
+        root, leaving out the output location.
+        """
+        with os.scandir(root) as entries:
+            return [
+                (entry.name, entry.path) for entry in entries
+                if entry.is_dir() and entry.path != self.loc]
+    
+    def newest(self, paths):
+        """Gives the structure directory holding the most recently modified
+        log, preferring the earlier root in a tie.
+        """
+        def latest(path):
+            with os.scandir(path) as entries:
+                return max([
+                    entry.stat().st_mtime_ns for entry in entries
+                    if '.log' in entry.name and entry.is_file()] + [-1])
+        times = [latest(path) for path in paths]
+        return paths[times.index(max(times))]
+    
+    @property
+    def catalog(self):
+        """The Catalog of the selected structure directories, listed on first
+        use.
+        """
+        if self._catalog is None:
+            mapper = map if self.scanner is None else self.scanner.map
+            self._catalog = Catalog(
+                {struct:self.path(struct) for struct in self.structs}, mapper)
+        return self._catalog
+    
+    def outname(self, name):
+        """Gives the filename of an output table, marked as a subset when
+        only some of the structures are analysed.
+        """
+        if self.only:
+            name += "_only"
+        return name + self.ext
+    
+    def path(self, struct):
+        """Gives the directory of a structure.
+        """
+        return self.dirs.get(struct, os.path.join(self.loc, struct))
+    
     def write_data(self, type, custom_out=None,
                         custom_data=None, format=None):
         # Choose the data type and output location. 
@@ -55,6 +229,18 @@ class Analysis():
                 pass
             data = self.therm_Es
             message = "thermodynamic values"
+        elif type == "traj":
+            out = self.traj_out
+            data = self.trajectories_all()
+            message = "optimization trajectories"
+        elif type == "props":
+            out = self.props_out
+            data = self.props_all()
+            message = "properties"
+        elif type == "dupes":
+            out = self.dupes_out
+            data = self.duplicates_all()
+            message = "duplicate geometries"
         elif type == "bonds":
             out = custom_out
             data = custom_data
@@ -72,21 +258,76 @@ class Analysis():
         
         # Write the data.
         
-        data.to_csv(os.path.join(self.loc, out), float_format=format)
+        self.write_table(data, out, format)
         print("Wrote {0} to {1}.".format(message, out))
     
+    def write_table(self, data, out, format=None):
+        """Writes a table to the output location in the configured format.
+        format is the float format used for CSV output. The file is replaced
+        atomically, so readers never see a partially written table.
+        """
+        path = os.path.join(self.loc, out)
+        temp = path + '.tmp'
+        with profile.stage('write'):
+            if self.format == 'csv':
+                data.to_csv(temp, float_format=format)
+            else:
+                data = self.schema(data)
+                if self.format == 'parquet':
+                    data.to_parquet(temp)
+                elif self.format == 'feather':
+                    data.reset_index().to_feather(temp)
+                elif self.format == 'hdf5':
+                    data.to_hdf(temp, key='table', mode='w', format='table')
+            os.replace(temp, path)
+    
+    def read_table(self, out):
+        """Reads a table written by write_table from the output location.
+        """
+        path = os.path.join(self.loc, out)
+        if self.format == 'csv':
+            return pd.read_csv(path, index_col=0)
+        elif self.format == 'parquet':
+            return pd.read_parquet(path)
+        elif self.format == 'feather':
+            return pd.read_feather(path).set_index('Structure')
+        elif self.format == 'hdf5':
+            if not os.path.exists(path):
+                raise FileNotFoundError(path)
+            return pd.read_hdf(path, key='table')
+    
+    def schema(self, data):
+        """Gives a table the fixed schema used for the columnar formats: a
+        string index named 'Structure', string column names, float64 numeric
+        columns and string label columns. Missing labels, such as the ground
+        state of a structure with no finished log, are kept missing. 
+        """
+        data = data.copy()
+        data.index = data.index.astype(str)
+        data.index.name = 'Structure'
+        data.columns = [str(c) for c in data.columns]
+        for col in data.columns:
+            if pd.api.types.is_numeric_dtype(data[col]):
+                data[col] = data[col].astype('float64')
+            else:
+                data[col] = data[col].astype(str).where(data[col].notna())
+        return data
+    
     @property
     def gEs(self):
         """Returns self.gEs, either from the existing assignment, from the
-        output file, or from a fresh calculation. 
+        output file, or from a fresh calculation. When the parse cache is in
+        use, the calculation is always refreshed, since only changed logs are
+        read again.
         """
         try:
             return self._gEs
         except AttributeError:
+            if self.cache is not None:
+                self._gEs = self.groundstates_all()
+                return self._gEs
             try:
-                self._gEs = pd.read_csv(
-                            os.path.join(self.loc, self.gs_out),
-                            index_col=0)
+                self._gEs = self.read_table(self.gs_out)
                 print("Reading ground spin states from %s." % self.gs_out)
             except OSError:
                 self._gEs = self.groundstates_all()
@@ -95,15 +336,18 @@ class Analysis():
     @property
     def therm_Es(self):
         """Returns self.therm_Es, either from the existing assignment, from the
-        output file, or from a fresh calculation. 
+        output file, or from a fresh calculation. When the parse cache is in
+        use, the calculation is always refreshed, since only changed logs are
+        read again.
         """
         try:
             return self._therm_Es
         except AttributeError:
+            if self.cache is not None:
+                self._therm_Es = self.thermo_all()
+                return self._therm_Es
             try:
-                self._therm_Es = pd.read_csv(
-                            os.path.join(self.loc, self.thermo_out),
-                            index_col=0)
+                self._therm_Es = self.read_table(self.thermo_out)
                 print("Reading thermodynamic values from %s."
                         % self.thermo_out)
             except OSError:
@@ -116,14 +360,178 @@ class Analysis():
         
         print("Calculating ground spin states.")
         # Collect state energies from files. 
-        results = [self.get_states(struct) for struct in self.structs]
+        results = self.map_structs('get_states')
+        self.save_cache()
+        
+        with profile.stage('tabulate'):
+            return self.gs_table(self.structs, results)
+    
+    def trajectories_all(self):
+        """Tabulates every optimization cycle of the latest geo.log of each
+        spin state of each structure, one row per cycle, whether or not the
+        optimization has converged.
+        """
+        print("Collecting optimization trajectories.")
+        results = self.map_structs('get_trajectories')
+        self.save_cache()
+        
+        with profile.stage('tabulate'):
+            return self.traj_table(self.structs, results)
+    
+    def traj_table(self, structs, results):
+        """Constructs the trajectory table from a list of state:trajectory
+        dictionaries, one for each structure. 
+        """
+        headers = {
+            'cycle':'Cycle', 'energy':'E', 'energy change':'dE',
+            'rms gradient':'RMS grad', 'max gradient':'MAX grad',
+            'rms step':'RMS step', 'max step':'MAX step'}
+        frames = []
+        for struct, states in zip(structs, results):
+            for state in sorted(states):
+                frame = pd.DataFrame(states[state]).rename(columns=headers)
+                frame['Cycle'] = frame['Cycle'].astype(int)
+                frame.insert(0, 'State', state)
+                frame.index = [struct]*len(frame)
+                frames.append(frame)
+        if not frames:
+            return pd.DataFrame(columns=['State'] + list(headers.values()))
+        return pd.concat(frames)
+    
+    def props_all(self):
+        """Tabulates the properties read by the registered extractors from
+        the latest converged geo.log of each spin state of each structure.
+        """
+        print("Collecting properties.")
+        results = self.map_structs('get_props')
+        self.save_cache()
+        
+        with profile.stage('tabulate'):
+            return self.props_table(self.structs, results)
+    
+    def props_table(self, structs, results, names=None):
+        """Constructs the long-format property table from a list of
+        state:properties dictionaries, one for each structure. Each row holds
+        one value, with its state, property, atom (-1 for a property of the
+        whole molecule), element and quantity. Only the named properties (by
+        default, those of config.analysis['properties']) are kept.
+        """
+        if names is None:
+            names = config.analysis.get('properties')
+        columns = ['State', 'Property', 'Atom', 'Element', 'Quantity',
+                    'Value']
+        labels = []
+        blocks = []
+        for struct, states in zip(structs, results):
+            for state in sorted(states):
+                for name, prop in states[state].items():
+                    if names is not None and name not in names:
+                        continue
+                    values = np.asarray(prop['values'], dtype=float)
+                    rows, cols = values.shape
+                    if prop['elements'] is None:
+                        atoms = np.full(rows, -1)
+                        elements = np.full(rows, '')
+                    else:
+                        atoms = np.arange(rows)
+                        elements = np.asarray(prop['elements'])
+                    labels.append((struct, state, name))
+                    blocks.append((
+                        np.repeat(atoms, cols), np.repeat(elements, cols),
+                        np.tile(prop['columns'], rows), values.ravel()))
+        if not blocks:
+            return pd.DataFrame(columns=columns)
+        
+        # Build each column as a single array. 
+        sizes = [len(block[-1]) for block in blocks]
+        structs, states, names = [
+            np.repeat(np.array(label, dtype=object), sizes)
+            for label in zip(*labels)]
+        atoms, elements, quantities, values = [
+            np.concatenate(arrays) for arrays in zip(*blocks)]
+        return pd.DataFrame(
+            dict(zip(columns, (
+                states, names, atoms, elements.astype(object),
+                quantities.astype(object), values))),
+            index=structs)
+    
+    def duplicates_all(self, cutoff=None):
+        """Finds the optimized geometries (the latest geo .xyz file of each
+        spin state of each structure) that duplicate one another. Geometries
+        are grouped by composition, and each group is clustered so that every
+        member is within cutoff RMSD (in Angstroms, after alignment) of its
+        cluster's representative, which is the geometry with the lowest
+        energy. The atoms of each element are matched in file order. Returns
+        a table of every geometry, with its cluster and representative. 
+        """
+        if cutoff is None:
+            cutoff = config.analysis.get('duplicate_rmsd', 0.1)
+        print("Comparing optimized geometries.")
+        
+        # Load the geometries, with the atoms ordered by element. 
+        found = [
+            (struct, state) for struct in self.structs
+            for state in self.states
+            if self.catalog.files(struct, state + "geo.xyz")]
+        groups = {}
+        geoms = []
+        for struct, state in found:
+            file, elems, coords = self.get_coords(struct, state, "geo")
+            if len(coords) == 0:
+                continue
+            order = np.argsort(elems, kind='stable')
+            names, counts = np.unique(elems, return_counts=True)
+            formula = "".join(
+                name + (str(count) if count > 1 else "")
+                for name, count in zip(names, counts))
+            groups.setdefault(formula, []).append(len(geoms))
+            geoms.append((struct, state, formula, coords[order]))
+        
+        # Lower energies are taken as representatives first. 
+        energies = self.gEs
         
-        # Construct dataframe. 
+        columns = ['State', 'Formula', 'Cluster', 'Size', 'Representative',
+                    'Rep State', 'RMSD', 'Duplicate']
+        rows = []
+        index = []
+        clusters = 0
+        with profile.stage('tabulate'):
+            for formula, members in groups.items():
+                coords = np.stack([geoms[m][3] for m in members])
+                E = np.array([
+                    energies.get(geoms[m][1], {}).get(geoms[m][0], np.nan)
+                    for m in members], dtype=float)
+                leaders, rmsds = geometry.cluster(
+                                    coords, cutoff, np.argsort(E))
+                sizes = np.bincount(leaders, minlength=len(members))
+                ids = np.cumsum(sizes > 0) - 1 + clusters
+                clusters = ids[-1] + 1
+                for m, leader, rmsd in zip(members, leaders, rmsds):
+                    struct, state = geoms[m][:2]
+                    rep, rep_state = geoms[members[leader]][:2]
+                    index.append(struct)
+                    rows.append((
+                        state, formula, ids[leader], sizes[leader], rep,
+                        rep_state, rmsd, m != members[leader]))
+        
+        data = pd.DataFrame(rows, index=index, columns=columns)
+        data = data.sort_values(
+                    ['Cluster', 'Duplicate', 'RMSD'], kind='stable')
+        print("{0} of {1} geometries duplicate another.".format(
+                    int(data['Duplicate'].sum()), len(data)))
+        return data
+    
+    def gs_table(self, structs, results):
+        """Constructs the ground state table from a list of state:energy
+        dictionaries, one for each structure. 
+        """
         headers = np.array(self.states)
         gEs = (
-            pd.DataFrame(data=results, index=self.structs, columns=headers))
+            pd.DataFrame(data=results, index=structs, columns=headers))
         
-        gEs['Ground State'] = gEs.idxmin(axis=1)
+        # Structures with no finished log are left without a ground state. 
+        energies = gEs[headers].dropna(how='all')
+        gEs['Ground State'] = energies.idxmin(axis=1).reindex(gEs.index)
         
         return gEs
     
@@ -133,12 +541,31 @@ class Analysis():
         
         print("Calculating thermodynamic values.")
         # Collect thermodynamic values from files. 
-        results = dvals([self.get_thermo(struct) for struct in self.structs])
+        results = self.map_structs('get_thermo')
+        self.save_cache()
         
-        # Construct dataframe. 
+        # Spectra are saved in a pass of their own, outside the cache, so that
+        # a missing .npz file is written again on the next run. 
+        if config.analysis.get('spectra'):
+            self.spectra_all()
+        
+        with profile.stage('tabulate'):
+            return self.thermo_table(self.structs, results)
+    
+    def spectra_all(self):
+        """Saves the vibrational spectrum of every current freq .log file
+        whose .npz file is missing or older than the log.
+        """
+        print("Saving vibrational spectra.")
+        self.map_structs('get_spectra')
+    
+    def thermo_table(self, structs, results):
+        """Constructs the thermodynamic table from a list of state:values
+        dictionaries, one for each structure. 
+        """
         headers = np.array(self.thermvals)
         thermoEs = (
-            pd.DataFrame(data=results, index=self.structs, columns=headers))
+            pd.DataFrame(data=dvals(results), index=structs, columns=headers))
         
         # thermoEs['Ground State'] = gEs.idxmin(axis=1)
         # print(thermoEs)
@@ -148,104 +575,310 @@ class Analysis():
         """Returns a dictionary of energies of the various spin states for a
         structure, using all available distinct spin-state calculations. 
         """
-        dir = IO(dir=os.path.join(self.loc, structure))
+        dir = IO(dir=self.path(structure))
+        return dir.get_values(
+                structure, "geo.log", self.geovalid, self.finalE, self.cache,
+                self.catalog)
+    
+    def get_trajectories(self, structure):
+        """Returns a dictionary of the optimization trajectories of the various
+        spin states of a structure. 
+        """
+        dir = IO(dir=self.path(structure))
+        return dir.get_values(
+                structure, "geo.log", self.readable, self.opt_trajectory,
+                self.cache, self.catalog)
+    
+    def get_props(self, structure):
+        """Returns a dictionary of the properties of the various spin states
+        of a structure. 
+        """
+        dir = IO(dir=self.path(structure))
         return dir.get_values(
-                structure, "geo.log", self.geovalid, self.finalE)
+                structure, "geo.log", self.geovalid, self.prop_vals,
+                self.cache, self.catalog, self.props_kind)
+    
+    @property
+    def props_kind(self):
+        """The cache kind of the property values, which changes whenever an
+        extractor is registered, so that the logs are read again.
+        """
+        return 'prop_vals:' + ','.join(sorted(extractors.registry))
     
     def get_thermo(self, structure):
         """Returns a dictionary of thermodynamic values for a structure, using all available distinct spin-state calculations. 
         """
-        dir = IO(dir=os.path.join(self.loc, structure))
+        dir = IO(dir=self.path(structure))
         values = dir.get_values(
-                structure, "freq.log", self.freqvalid, self.thermo_vals)
+                structure, "freq.log", self.freqvalid, self.thermo_vals,
+                self.cache, self.catalog)
         
         return values
     
+    def get_spectra(self, structure):
+        """Saves the vibrational spectra of the various spin states of a
+        structure, returning a state:filename dictionary of those written. 
+        """
+        dir = IO(dir=self.path(structure))
+        return dir.get_values(
+                structure, "freq.log", self.spectrumstale, self.save_spectrum,
+                None, self.catalog)
+    
+    def get_thermo_data(self, structure):
+        """Returns a dictionary of the data needed to recompute the
+        thermochemistry of a structure at other temperatures and pressures.
+        """
+        # The kind is versioned, as values cached before the energy was read
+        # from the whole log could be missing it. 
+        dir = IO(dir=self.path(structure))
+        return dir.get_values(
+                structure, "freq.log", self.freqvalid, self.thermo_data,
+                self.cache, self.catalog, 'thermo_data:2')
+    
+    def thermo_grid(self, T, p=1.0, symm=None, qrrho=None):
+        """Recomputes the enthalpy, entropy and Gibbs free energy of every
+        structure over a grid of temperatures (K) and pressures (atm), from
+        the frequencies and the rotational and translational terms of its
+        freq .log file. symm gives the rotational symmetry number of a
+        structure name (1 by default), and qrrho the cutoff in cm^-1 of the
+        quasi-RRHO treatment of low modes (by default, from config). Returns a
+        dictionary of (structures, T, p) arrays, with the structures listed
+        under 'structs'. 
+        """
+        if qrrho is None:
+            qrrho = config.analysis.get('qrrho')
         
-    def write_inp_all(self, type, template):
-        """Used for writing input files based on previous calculations that 
-        generate .xyz and .gbw files. 
+        results = self.map_structs('get_thermo_data')
+        self.save_cache()
+        
+        with profile.stage('tabulate'):
+            data = {
+                struct:values for struct, values in zip(self.structs,
+                dvals(results)) if values}
+            structs = sorted(data)
+            rows = [data[struct] for struct in structs]
+            column = lambda key: [row[key] for row in rows]
+            if symm is None:
+                symm = lambda struct: 1
+            
+            grid = thermo.grid(
+                column('E'), thermo.pad(column('frequencies')),
+                np.array(column('S*T (el)'))/column('T0'),
+                np.array(column('S*T (trans)'))/column('T0'),
+                column('qrot'), column('rot #'),
+                [symm(struct) for struct in structs], column('T0'),
+                column('p0'), T, p, qrrho)
+        
+        grid.update({'structs':structs, 'T':np.atleast_1d(T),
+                        'p':np.atleast_1d(p)})
+        return grid
+    
+    def map_structs(self, method, structs=None):
+        """Runs the named per-structure method on every structure (or on the
+        given list of structures), returning the results in the same order.
+        With more than one job, the structures are spread across a process
+        pool; otherwise, on a network filesystem, their I/O is overlapped on
+        the async scanner. 
         """
+        if structs is None:
+            structs = self.structs
         
-        for struct in self.structs:
-            try:
-                state = self.gEs.loc[struct,'Ground State']
-                if state in self.states:
-                    self.assemble_inp(struct, template, state, type)
-            except KeyError:
-                print("Ground state missing for %s. Rerun whaler gs." % struct)
+        # List the campaign here, so that the workers share the listing.
+        self.catalog
+        if self.jobs == 1 or len(structs) < 2:
+            if self.scanner is not None:
+                return self.scanner.map(getattr(self, method), structs)
+            return [getattr(self, method)(struct) for struct in structs]
         
-    def write_inp(self, struct, template, state, coords, filename, gbw=None):
+        chunksize = max(1, len(structs) // (self.jobs*4))
+        results = []
+        with ProcessPoolExecutor(
+                    self.jobs, initializer=_init_worker,
+                    initargs=(self, profile.enabled)) as pool:
+            for values, updates, profiled in pool.map(
+                    _run_worker, repeat(method), structs,
+                    chunksize=chunksize):
+                results.append(values)
+                if self.cache is not None:
+                    self.cache.update(updates)
+                if profile.enabled:
+                    profile.merge(profiled)
+        
+        return results
+    
+    def save_cache(self):
+        """Writes any newly parsed log values to the cache file.
+        """
+        if self.cache is not None:
+            with profile.stage('write'):
+                self.cache.save()
+        
+    def write_inp_all(self, type, template):
+        """Used for writing input files based on previous calculations that 
+        generate .xyz and .gbw files. The template is read once, the
+        ground-state geometries are collected in one pass, and the rendered
+        inputs are written by a pool of threads. Messages are written to the
+        log file together at the end. The template is read from the working
+        directory.
         """
+        self.logfile.hold()
+        try:
+            # Find the ground state of each structure. 
+            jobs = []
+            for struct in self.structs:
+                try:
+                    state = self.gEs.loc[struct,'Ground State']
+                    if state in self.states:
+                        jobs.append((struct, state))
+                except KeyError:
+                    print("Ground state missing for %s. Rerun whaler gs."
+                            % struct)
+            
+            # Collect the geometries, and render the inputs. 
+            with open(template, "rt") as f:
+                text = f.read()
+            mapper = map if self.scanner is None else self.scanner.map
+            geometries = list(mapper(
+                lambda job: self.get_xyz(job[0], job[1], "geo"), jobs))
+            
+            outputs = []
+            for (struct, state), (xyzfile, coords) in zip(jobs, geometries):
+                if coords == []:
+                    continue
+                filename, gbw = self.inp_names(xyzfile, type)
+                outfile = os.path.join(self.path(struct), filename)
+                if self.gbw_used(struct, filename):
+                    outputs.append((None, self.skip_message(filename)))
+                else:
+                    outputs.append(((outfile, self.render_inp(
+                        struct, text, state, coords, gbw)),
+                        "Wrote " + filename + "."))
+            
+            # Write the inputs, reporting each write only once it has
+            # succeeded. The first failure is raised after the others have
+            # been reported. 
+            workers = max(1, config.filegen.get('workers', 8))
+            failed = None
+            with ThreadPoolExecutor(workers) as pool:
+                writes = [
+                    pool.submit(self.write_text, out) if out else None
+                    for out, message in outputs]
+                for (out, message), write in zip(outputs, writes):
+                    if write is not None:
+                        try:
+                            write.result()
+                        except OSError as e:
+                            message = "Could not write %s: %s" % (out[0], e)
+                            if failed is None:
+                                failed = e
+                    print(message)
+                    self.logfile.appendline(message)
+            if failed is not None:
+                raise failed
+        finally:
+            self.logfile.flush()
+    
+    def write_inp(self, struct, template, state, coords, filename, gbw=None):
+        """Writes one input file from the template in the working directory.
         """
-        path = os.path.join(self.loc, struct)
+        path = self.path(struct)
         outfile = os.path.join(path, filename)
         
-        # Choose the state number. 
-        statenum = self.statekey[state]
-        
         # Read the template. Plug values into the template.
-        if os.path.exists(outfile.split('.')[0] + ".gbw"):
-            message = ("Skipping %s"
-                        " because it has already been used in a calculation."
-                        % filename)
-            
+        if self.gbw_used(struct, filename):
+            message = self.skip_message(filename)
         else:
-            reader = IO(template, self.loc)
-            
-            replacekey = {
-                            "[struct]":struct,
-                            "[spin]":str(statenum),
-                            "[coords]":"\n".join(coords)}
-            if gbw is None:
-                replacekey["MOREAD"] = "#MOREAD"
-                replacekey["%moinp"] = "# %moinp"
-            else:
-                replacekey["[gbw]"] = gbw
-            
-            reader.replace_all_vals(replacekey, outfile)
+            with open(template, "rt") as f:
+                text = f.read()
+            self.write_text(
+                (outfile, self.render_inp(struct, text, state, coords, gbw)))
             message = "Wrote " + filename + "."
         
         print(message)
         self.logfile.appendline(message)
     
+    def render_inp(self, struct, text, state, coords, gbw=None):
+        """Plugs a structure's values into the text of an input template.
+        """
+        # Choose the state number. 
+        statenum = self.statekey[state]
+        
+        replacekey = {
+                        "[struct]":struct,
+                        "[spin]":str(statenum),
+                        "[coords]":"\n".join(coords)}
+        if gbw is None:
+            replacekey["MOREAD"] = "#MOREAD"
+            replacekey["%moinp"] = "# %moinp"
+        else:
+            replacekey["[gbw]"] = gbw
+        
+        for old, new in replacekey.items():
+            text = text.replace(old, new)
+        return text
+    
+    def inp_names(self, xyzfile, type):
+        """Gives the input filename and the .gbw file to read orbitals from
+        for a geometry's .xyz file.
+        """
+        filename = xyzfile.split("geo")[0] + type + ".inp"
+        gbw = xyzfile.split(".")[0] + ".gbw"
+        return (filename, gbw)
+    
+    def gbw_used(self, struct, filename):
+        """Whether an input file has already been run, leaving a .gbw file.
+        """
+        gbwfile = filename.split('.')[0] + ".gbw"
+        return self.catalog.entry(struct, gbwfile) is not None
+    
+    def skip_message(self, filename):
+        return ("Skipping %s because it has already been used in a "
+                "calculation." % filename)
+    
+    def write_text(self, output):
+        """Writes a single (filename, text) output.
+        """
+        outfile, text = output
+        with open(outfile, "wt") as f:
+            f.write(text)
+    
     def assemble_inp(self, struct, template, state, type):
         """
         """
         # Get the xyz coordinates for the input file. 
         xyzfile, coords = self.get_xyz(struct, state, "geo")
         
-        # Make the filename.
-        filename = xyzfile.split("geo")[0] + type + ".inp"
-        
-        # Find the gbw file.
-        gbw = xyzfile.split(".")[0] + ".gbw"
+        # Make the filename, and find the gbw file.
+        filename, gbw = self.inp_names(xyzfile, type)
         
         # Write the .inp file.
         if coords != []:
             self.write_inp(struct, template, state, coords, filename, gbw)
-        
+    
     def get_xyz(self, struct, state, type="start"):
         """
         """
-        path = os.path.join(self.loc, struct)
-        dir = IO(dir=path)
+        path = self.path(struct)
         
         # Filter down to the appropriate .xyz file. 
-        xyzfile = sorted(dir.files_end_with(state + type + ".xyz"))[-1]
+        xyzfile = sorted(
+                    self.catalog.files(struct, state + type + ".xyz"))[-1]
         
-        # Check if the .xyz file has been aligned. 
-        if self.xyz_aligned(xyzfile, path):
-            reader = IO(xyzfile, path)
-            return (xyzfile, reader.lines()[2:])
+        # Check if the .xyz file has been aligned, reading it only once. 
+        with IO(xyzfile, path).open() as f:
+            text = f.read()
+        head = text.splitlines(keepends=True)[:3]
+        if self.xyz_aligned(xyzfile, path, head):
+            return (xyzfile, text.splitlines()[2:])
         else:
             return (xyzfile, [])
     
-    def xyz_aligned(self, filename, dir):
+    def xyz_aligned(self, filename, dir, xyzhead=None):
         """
         """
-        reader = IO(filename, dir)
-        xyzhead = reader.head(3)
+        if xyzhead is None:
+            reader = IO(filename, dir)
+            xyzhead = reader.head(3)
         if 'Coordinates' in xyzhead[1]:
             message = filename + ' needs alignment.'
             print(message)
@@ -260,179 +893,296 @@ class Analysis():
             return False
     
     def xyz_to_coords(self, xyz):
-        """Converts a list of .xyz file lines into a list of atom-labeled
-        coordinates.
+        """Converts a list of .xyz file lines into an array of element labels
+        and an (N, 3) array of coordinates.
+        """
+        if len(xyz) == 0:
+            return (np.array([], dtype=str), np.zeros((0, 3)))
+        
+        rawcoords = np.array([line.split()[:4] for line in xyz])
+        return (rawcoords[:,0], rawcoords[:,1:].astype(float))
+    
+    def get_coords(self, struct, state, type="geo"):
+        """Returns the .xyz filename, element labels and coordinate array for a
+        structure in a given spin state. The coordinate store is used when it
+        is enabled, so that the .xyz files are only read when they change.
         """
-        coords = []
-        for line in xyz:
-            rawcoord = line.split()
-            coord = [rawcoord[0]] + [float(n) for n in rawcoord[1:]]
-            coords.append(coord)
+        if self.coordstore is not None:
+            if not self.coords_refreshed:
+                self.coordstore.refresh(
+                    {struct:self.path(struct) for struct in self.structs},
+                    self.read_xyz, self.catalog)
+                self.coords_refreshed = True
+            stored = self.coordstore.get(struct, state, type)
+            if stored is not None:
+                return stored
         
-        return coords
+        file, rawcoords = self.get_xyz(struct, state, type)
+        elems, coords = self.xyz_to_coords(rawcoords)
+        return (file, elems, coords)
+    
+    def read_xyz(self, file, path):
+        """Reads the element labels and coordinate array from an .xyz file,
+        giving empty arrays if the file has not been aligned. 
+        """
+        if self.xyz_aligned(file, path):
+            return self.xyz_to_coords(IO(file, path).lines()[2:])
+        else:
+            return self.xyz_to_coords([])
     
     def bondlength(self, struct, state, elem1, elem2, axis='z', skip=0):
+        """Returns the distance between the elem1 and elem2 atoms furthest
+        along the given axis, after skipping the given number of furthest
+        atoms. 'M' stands for the element of the first atom. 
+        """
+        return self.bondlengths(
+                    [(struct, state, elem1, elem2, axis, skip)])[0]
+    
+    def bondlengths(self, requests):
+        """Takes a list of (struct, state, elem1, elem2, axis, skip) tuples, as
+        used by bondlength, and returns the list of bond lengths. Each geometry
+        is read once, and all of the distances are calculated in one call.
         """
+        loaded = {}
+        coordsets = []
+        pairs = []
+        found = []
+        offset = 0
+        
+        for struct, state, elem1, elem2, axis, skip in requests:
+            
+            # Get the coordinates. 
+            if (struct, state) not in loaded:
+                file, elems, coords = self.get_coords(struct, state, "geo")
+                if len(coords) == 0:
+                    print("Can't get coordinates from %s." % file)
+                    loaded[(struct, state)] = None
+                else:
+                    loaded[(struct, state)] = (elems, coords, offset)
+                    coordsets.append(coords)
+                    offset += len(coords)
+            
+            if loaded[(struct, state)] is None:
+                found.append(False)
+                continue
+            elems, coords, start = loaded[(struct, state)]
+            
+            # Find the atoms of the right elements. 
+            pair = self.bondatoms(elems, coords, elem1, elem2, axis, skip)
+            if pair is None:
+                found.append(False)
+            else:
+                found.append(True)
+                pairs.append([start + pair[0], start + pair[1]])
+        
+        # Calculate the bond lengths. 
+        if pairs:
+            lengths = iter(geometry.distances(np.vstack(coordsets), pairs))
+        return [next(lengths) if f else None for f in found]
+    
+    def bondatoms(self, elems, coords, elem1, elem2, axis='z', skip=0):
+        """Gives the indices of the elem1 and elem2 atoms furthest along the
+        given axis, after eliminating the skip atoms of either element that
+        are furthest along it.
         """
-        axiskey = {'x':1, 'y':2, 'z':3}
+        axiskey = {'x':0, 'y':1, 'z':2}
+        targets = [elems[0] if e == 'M' else e for e in (elem1, elem2)]
+        
+        # Find the atoms of the right elements. 
+        atoms = np.flatnonzero(np.isin(elems, targets))
+        axis_coord = coords[:,axiskey[axis]]
         
-        # Get the coordinates. 
-        file, rawcoords = self.get_xyz(struct, state, "geo")
-        coords = self.xyz_to_coords(rawcoords)
+        # Eliminate skipped atoms. 
+        for x in range(min(skip, len(atoms))):
+            atoms = np.delete(atoms, np.argmax(axis_coord[atoms]))
         
-        if coords == []:
+        # Choose the 2 atoms furthest along the given axis.
+        chosen = []
+        for elem in targets:
+            candidates = atoms[elems[atoms] == elem]
+            if len(candidates) == 0:
+                return None
+            pick = candidates[np.argmax(axis_coord[candidates])]
+            chosen.append(pick)
+            atoms = atoms[atoms != pick]
+        
+        return chosen
+    
+    def neighbors(self, struct, state, elem1, elem2, cutoff):
+        """Returns a table of all elem1-elem2 atom pairs in a structure that are
+        closer than cutoff (in angstroms). 'M' stands for the element of the
+        first atom. 
+        """
+        file, elems, coords = self.get_coords(struct, state, "geo")
+        if len(coords) == 0:
             print("Can't get coordinates from %s." % file)
             return None
-        else:
+        elem1, elem2 = [elems[0] if e == 'M' else e for e in (elem1, elem2)]
         
-            # Find the atoms of the right elements. 
-            elems = [elem1, elem2]
-            for i in range(2):
-                if elems[i] == 'M':
-                    elems[i] = coords[0][0]
-            
-            atomlist = [atom for atom in coords if atom[0] in elems]
-            
-            # Eliminate skipped atoms. 
-            for x in range(skip):
-                axis_coord = list(zip(*atomlist))[axiskey[axis]]
-                maxindex = axis_coord.index(max(axis_coord))
-                del atomlist[maxindex]
-            
-            # Choose the 2 atoms furthest along the given axis.
-            atoms = []
-            for elem in elems:
-                axis_max = -99999
-                maxindex = None
-                for i,atom in enumerate(atomlist):
-                    if atom[0] == elem and atom[axiskey[axis]] > axis_max:
-                        axis_max = atom[axiskey[axis]]
-                        maxindex = i
-                atoms.append(np.array(atomlist.pop(maxindex)[1:]))
-            
-            # Calculate the bond length. 
-            length = np.sqrt(np.sum((atoms[0] - atoms[1])**2))
-            
-            return length
+        pairs, lengths = geometry.neighbors(elems, coords, elem1, elem2, cutoff)
+        return pd.DataFrame({
+                    'Atom 1':pairs[:,0], 'Atom 2':pairs[:,1],
+                    'Length':lengths})
+    
+    def spectrum_file(self, scan):
+        """Gives the .npz file holding the spectrum of a freq .log file.
+        """
+        return os.path.splitext(strip_compression(scan.fn))[0] + '.npz'
+    
+    def spectrumstale(self, scan):
+        """Accepts a valid freq .log file whose saved spectrum is missing or
+        older than the log.
+        """
+        try:
+            saved = os.stat(self.spectrum_file(scan)).st_mtime_ns
+        except OSError:
+            saved = None
+        if saved is not None and saved >= os.stat(scan.fn).st_mtime_ns:
+            return False
+        
+        # The thermo pass has already judged the log, and reported it. 
+        if self.cache is not None:
+            cached = self.cache.get(
+                        scan.fn, 'thermo_vals', self.cache.signature(scan.fn))
+            if cached is not None:
+                return cached[0]
+        return self.freqvalid(scan)
+    
+    def save_spectrum(self, scan):
+        """Saves the vibrational spectrum of a scanned freq .log file as a
+        compressed .npz file of the same name, next to the log. Returns the
+        filename, or None if it could not be written.
+        """
+        npzfile = self.spectrum_file(scan)
+        arrays = scan.spectrum(config.analysis.get('normal_modes', False))
+        try:
+            np.savez_compressed(npzfile, **arrays)
+        except OSError as e:
+            message = "Could not write %s: %s" % (npzfile, e)
+            print(message)
+            self.logfile.appendline(message)
+            return None
+        return npzfile
+    
+    def spectrum(self, struct, state):
+        """Loads the saved vibrational spectrum of a structure in a given spin
+        state. The arrays of the returned NpzFile are read lazily, on access.
+        """
+        path = self.path(struct)
+        dir = IO(dir=path)
+        npzfile = sorted(dir.files_end_with(state + "freq.npz"))[-1]
+        return np.load(os.path.join(path, npzfile))
     
-    def geovalid(self, file, path):
+    def geovalid(self, scan):
+        """
         """
+        return self.isvalid(scan) and self.geoconverged(scan)
+    
+    def readable(self, scan):
+        """Accepts any log, converged or not, for diagnostics.
         """
-        return self.isvalid(file, path) and self.geoconverged(file, path)
+        return True
     
-    def freqvalid(self, file, path):
+    def freqvalid(self, scan):
         """
         """
-        return self.isvalid(file, path) and self.freqconverged(file, path)
+        return self.isvalid(scan) and self.freqconverged(scan)
     
-    def isvalid(self, file, path):
+    def isvalid(self, scan):
         """
         """
-        reader = IO(file, path)
-        end = reader.tail(2)
-        if 'ABORTING THE RUN\n' in end:
-            message = file + ' aborted abnormally.'
+        status = scan.status
+        if status == 'aborted':
+            message = scan.file + ' aborted abnormally.'
             self.logfile.appendline(message)
             print(message)
             return False
-        elif 'ORCA TERMINATED NORMALLY' in end[0]:
+        elif status == 'normal':
             return True
         else:
-            message = file + ' has unknown structure.'
+            message = scan.file + ' has unknown structure.'
             self.logfile.appendline(message)
             print(message)
             return False
     
-    def geoconverged(self, file, path, chunk=100, maxsearch=1000):
+    def geoconverged(self, scan):
         """
         """
-        reader = IO(file, path)
-        tail = reader.tail(chunk)
-        if chunk > maxsearch:
-            self.logfile.appendline(file + ' has unknown structure.')
-            return False
-        elif 'WARNING!!!!!!!\n' in tail:
-            self.logfile.appendline(file + ' has not converged.')
+        if scan.optwarning:
+            self.logfile.appendline(scan.file + ' has not converged.')
             return False
-        elif '*** OPTIMIZATION RUN DONE ***' in ''.join(tail):
+        elif scan.optdone:
             return True
         else:
-            self.geoconverged(file, path, chunk*2)
+            self.logfile.appendline(scan.file + ' has unknown structure.')
+            return False
     
-    def freqconverged(self, file, path):
+    def freqconverged(self, scan):
         """
         """
-        reader = IO(file, path)
-        lines = reader.lines()
-        if ("ORCA_NUMFREQ: ORCA finished with an error in the energy"
-            " calculation") in lines:
-            print("SCF convergence error in %s." % file)
+        if scan.numfreq_error:
+            print("SCF convergence error in %s." % scan.file)
             return False
         else:
             return True
         
-    def finalE(self, file, path, chunk=100):
-        """Extracts the final Single Point Energy from a .log file. 
-        """
-        reader = IO(file, path)
-        tail = reader.tail(chunk)
-        marker = 'FINAL SINGLE POINT ENERGY'
-        energyline = [s for s in tail if marker in s]
-        if chunk > 1000:
-            self.logfile.appendline(file + ': cannot find final energy.')
-            return np.nan
-        elif energyline == []:
-            return self.finalE(file, path, chunk+100)
-        else:
-            return float(energyline[-1].split()[-1])
-    
-    def thermo_vals(self, file, path, chunk=100):
-        """Extracts the thermodynamic values from a .log file. 
-        """
-        reader = IO(file, path)
-        # print("Thermodynamic values can be extracted from %s." % file)
-        lines = reader.lines()
-        
-        # Mark the data locations.
-        marker1 = 'VIBRATIONAL FREQUENCIES'
-        marker2 = 'NORMAL MODES'
-        marker3 = 'INNER ENERGY'
-        for i in range(len(lines)):
-            line = lines[i]
-            if line == marker1:
-                vib_start = i+3
-            elif line == marker2:
-                vib_end = i-3
-            elif line == marker3:
-                therm_start = i
+    def finalE(self, scan):
+        """Extracts the final Single Point Energy from a scanned .log file. 
+        """
+        if np.isnan(scan.energy):
+            self.logfile.appendline(scan.file + ': cannot find final energy.')
+        return scan.energy
+    
+    def opt_trajectory(self, scan):
+        """Extracts the energy, gradients and steps of every optimization
+        cycle from a scanned geo .log file, streaming through the file. 
+        """
+        return {
+            field:values.tolist()
+            for field, values in scan.trajectory.items()}
+    
+    def prop_vals(self, scan):
+        """Extracts the properties of every registered extractor from a
+        scanned .log file, in a single pass through the file. 
+        """
+        values = scan.properties()
+        if not values:
+            self.logfile.appendline(scan.file + ': cannot find properties.')
+        return values
+    
+    def thermo_vals(self, scan):
+        """Extracts the thermodynamic values from a scanned .log file. 
+        """
+        file = scan.file
+        if scan.vib_lines is None or scan.therm_lines is None:
+            self.logfile.appendline(
+                file + ': cannot find thermodynamic values.')
+            return {}
         
         # Extract the data values. 
-        vib_lines = lines[vib_start:vib_end]
-        U = extr(lines[therm_start+19])[0]
-        H = extr(lines[therm_start+39])[0]
-        S_el = extr(lines[therm_start+54])[0]
-        S_vib = extr(lines[therm_start+55])[0]
-        S_trans = extr(lines[therm_start+57])[0]
-        linearity = lines[therm_start+65]
+        lines = scan.therm_lines
+        U = extr(lines[19])[0]
+        H = extr(lines[39])[0]
+        S_el = extr(lines[54])[0]
+        S_vib = extr(lines[55])[0]
+        S_trans = extr(lines[57])[0]
+        linearity = lines[65]
         if ' linear' in linearity:
             rot_num = 1
         elif 'nonlinear' in linearity:
             rot_num = 1.5
         else:
             raise
-        qrot = extr(lines[therm_start+68])[0]
+        qrot = extr(lines[68])[0]
         
-        vibs = [extr(line)[:2] for line in vib_lines]
-        img_modes = []
-        for vib in vibs:
-            if vib[1] < 0:
-                img_modes.append(vib)
+        freqs = scan.frequencies
+        img_modes = np.flatnonzero(freqs < 0)
         
         if len(img_modes) > 0:
             values = {}
             print("ERROR: %s contains imaginary modes:" % file)
             for mode in img_modes:
-                print("#{0}: {1} cm^-1".format(mode[0], mode[1]))
+                print("#{0}: {1} cm^-1".format(mode, freqs[mode]))
         else:
             values = {
                 'U':U, 'H':H, 'S*T (el)':S_el, 'S*T (vib)':S_vib,
@@ -440,4 +1190,27 @@ class Analysis():
 
         return values
     
+    def thermo_data(self, scan):
+        """Extracts the thermodynamic values from a scanned .log file, along
+        with the electronic energy, the real vibrational frequencies, and the
+        temperature and pressure of the thermochemistry. A log without an
+        electronic energy gives no values. 
+        """
+        values = self.thermo_vals(scan)
+        if values and np.isnan(scan.energy):
+            message = scan.file + ': cannot find final energy.'
+            print(message)
+            self.logfile.appendline(message)
+            values = {}
+        if values:
+            freqs = scan.frequencies
+            values.update({
+                'E':scan.energy, 'frequencies':freqs[freqs > 0].tolist(),
+                'T0':scan.temperature, 'p0':scan.pressure})
+            if np.isnan(values['T0']):
+                values['T0'] = 298.15
+            if np.isnan(values['p0']):
+                values['p0'] = 1.0
+        return values
+    
     
\ No newline at end of file
@@ -0,0 +1,115 @@
+"""
+This module contains the campaign file catalog: a single listing of every
+structure directory, with each filename parsed once into its iteration, spin
+state, calc type and extension, so that the analyses can query the listing
+instead of listing the directories again.
+"""
+
+import os
+import re
+import fnmatch
+from collections import namedtuple
+from .dataprep import strip_compression
+from .profiling import profile
+
+# A file of a structure directory. Names that do not follow the
+# xxxxxxx_NSyyy.ext formulation have None for iter, state and type.
+Entry = namedtuple('Entry', 'file iter state type ext size mtime')
+
+def parse(file):
+    """Takes a filename of the form xxxxxxx_NSyyy.ext (optionally compressed)
+    and gives its (iteration, spin state, calc type, extension), with None
+    for the labels that cannot be read.
+    """
+    labels = strip_compression(file).split('_')[-1]
+    name, dot, ext = labels.partition('.')
+    try:
+        return (int(labels[0]), labels[1], name[2:], ext)
+    except (ValueError, IndexError):
+        return (None, None, None, ext)
+
+def select(names, patterns):
+    """Gives the names matching any of the patterns, in their original order.
+    Patterns are shell-style globs, or regular expressions when prefixed with
+    're:'.
+    """
+    tests = []
+    for pattern in patterns:
+        if pattern.startswith('re:'):
+            tests.append(re.compile(pattern[3:]).fullmatch)
+        else:
+            tests.append(re.compile(fnmatch.translate(pattern)).match)
+    return [name for name in names if any(test(name) for test in tests)]
+
+class Catalog():
+    """An index of the files in each structure directory of a campaign, built
+    with one os.scandir pass per directory.
+    """
+    def __init__(self, dirs=None, mapper=map):
+        self.dirs = {}
+        self.entries = {}
+        if dirs:
+            self.update(dirs, mapper)
+    
+    def update(self, dirs, mapper=map):
+        """Lists the structure directories in a struct:path dictionary, in
+        place of any earlier listing of them. mapper may be given to list
+        them concurrently.
+        """
+        with profile.stage('scan'):
+            structs = list(dirs)
+            listings = mapper(self.scan, [dirs[s] for s in structs])
+            for struct, listing in zip(structs, listings):
+                self.dirs[struct] = dirs[struct]
+                self.entries[struct] = listing
+    
+    def scan(self, path):
+        """Gives the entries of the files in a directory, by filename.
+        """
+        listing = {}
+        try:
+            with os.scandir(path) as found:
+                for f in found:
+                    if not f.is_file():
+                        continue
+                    stat = f.stat()
+                    listing[f.name] = Entry(
+                        f.name, *parse(f.name), stat.st_size,
+                        stat.st_mtime_ns)
+        except OSError:
+            pass
+        return listing
+    
+    def files(self, struct, suffix, compressed=False):
+        """Returns the files of a structure ending with the given suffix, as
+        IO.files_end_with does.
+        """
+        listing = self.entries.get(struct, {})
+        found = [file for file in listing if file.endswith(suffix)]
+        if compressed:
+            present = set(found)
+            found += [
+                file for file in listing if file != strip_compression(file)
+                and strip_compression(file).endswith(suffix)
+                and strip_compression(file) not in present]
+        return found
+    
+    def entry(self, struct, file):
+        """Gives the entry of a file, or None if it is not listed.
+        """
+        return self.entries.get(struct, {}).get(file)
+    
+    def signature(self, struct, file):
+        """Gives the (size, mtime) pair of a listed file.
+        """
+        entry = self.entry(struct, file)
+        return [entry.size, entry.mtime]
+    
+    def table(self):
+        """Returns the whole catalog as a DataFrame, one row per file.
+        """
+        import pandas as pd
+        rows = [
+            (struct,) + entry for struct, listing in self.entries.items()
+            for entry in listing.values()]
+        return pd.DataFrame(rows, columns=('struct',) + Entry._fields)
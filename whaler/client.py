@@ -0,0 +1,133 @@
+"""
+This module contains the client of the whaler query server (whaler serve),
+which answers from a campaign held in memory. It only needs pandas once a
+table arrives, so that it stays light to import from scripts and notebooks.
+
+Usage:
+    
+    >> from whaler.client import Client
+    >> gEs = Client().gs()
+"""
+
+import json
+import os
+import socket
+from . import config
+
+def address(spec=None, loc=None):
+    """Takes a server address, as 'host:port' for TCP or as the path of a
+    Unix socket (relative to loc, or to the output location), and gives the
+    (family, address) pair to connect or bind to.
+    """
+    if spec is None:
+        spec = config.server.get('address', 'whaler.sock')
+    host, colon, port = str(spec).rpartition(':')
+    if colon and port.isdigit() and os.sep not in spec:
+        return (socket.AF_INET, (host or 'localhost', int(port)))
+    if loc is None:
+        loc = os.path.abspath(config.path.get('output', '.'))
+    return (socket.AF_UNIX, os.path.join(loc, spec))
+
+def decode(table):
+    """Rebuilds a DataFrame sent by the server.
+    """
+    import pandas as pd
+    data = pd.DataFrame(
+        table['data'], index=table['index'], columns=table['columns'])
+    data.index.name = table['name']
+    return data
+
+class Client():
+    """A connection to a running whaler server. Each query gives a
+    DataFrame, optionally narrowed to the structures matching the glob (or
+    're:' regular expression) patterns in only.
+    """
+    def __init__(self, spec=None, timeout=None):
+        family, self.address = address(spec)
+        if timeout is None:
+            timeout = config.server.get('timeout', 60)
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(self.address)
+        self.reader = self.sock.makefile('rb')
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+    
+    def request(self, query, **args):
+        """Sends a query and returns the server's decoded reply, raising
+        RuntimeError if the query failed.
+        """
+        message = dict(args, query=query)
+        self.sock.sendall(json.dumps(message).encode() + b'\n')
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("The whaler server closed the connection.")
+        reply = json.loads(line)
+        if not reply['ok']:
+            raise RuntimeError(reply['error'])
+        return reply
+    
+    def query(self, query, only=None):
+        """Returns the table answering a query.
+        """
+        return decode(self.request(query, only=only)['table'])
+    
+    def gs(self, only=None):
+        """Energies of each spin state, and the ground state.
+        """
+        return self.query('gs', only)
+    
+    def thermo(self, only=None):
+        """Thermodynamic values of the ground states.
+        """
+        return self.query('thermo', only)
+    
+    def traj(self, only=None):
+        """Cycles of every geometry optimization.
+        """
+        return self.query('traj', only)
+    
+    def props(self, only=None):
+        """Atomic charges, spin populations, dipoles and <S**2>, one value
+        per row.
+        """
+        return self.query('props', only)
+    
+    def dupes(self, only=None):
+        """Clusters of optimized geometries that duplicate each other.
+        """
+        return self.query('dupes', only)
+    
+    def crude_N2(self, only=None):
+        """Reaction energies from the geo.log energies, in kcal/mol.
+        """
+        return self.query('crudeN2', only)
+    
+    def N2_act(self, only=None):
+        """Reaction free energies from the thermodynamic values, in kcal/mol.
+        """
+        return self.query('N2act', only)
+    
+    def bonds(self, only=None):
+        """M-M, M-N and N-N bond lengths.
+        """
+        return self.query('N2bonds', only)
+    
+    def structs(self):
+        """The structures the server holds.
+        """
+        return self.request('structs')['structs']
+    
+    def refresh(self):
+        """Makes the server check for changed logs at once, returning the
+        number of structures that had changed.
+        """
+        return self.request('refresh')['changed']
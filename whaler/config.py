@@ -4,11 +4,85 @@ wish to modify.
 """
 
 path = dict(
-    input = 'data',
-    output = 'data',
-
+    # Campaign roots holding the structure directories, scanned together. A
+    # structure found in several roots is taken from the one with its newest
+    # log. 
+    input = ['.'],
+    
+    # Location of the result tables, caches and whaler.log. 
+    output = '.',
     )
 
 analysis = dict(
+    # Sidecar index of parsed log values, stored in the campaign directory.
+    # Set to None to reparse every log on every run. 
+    cache = '.whaler_cache.json',
+    
+    # Packed coordinate store (.bin data and .json index), stored in the
+    # campaign directory. Set to None to read the .xyz files directly. 
+    coords = '.whaler_coords',
+    
+    # Format of the output tables: 'csv', 'parquet', 'feather' or 'hdf5'.
+    # The columnar formats require pyarrow (parquet, feather) or PyTables
+    # (hdf5). 
+    format = 'csv',
+    
+    # Save the vibrational spectrum of each freq .log file next to it as a
+    # compressed .npz file, optionally including the normal modes. The thermo
+    # command writes those that are missing or older than their logs. 
+    spectra = False,
+    normal_modes = False,
+    
+    # Cutoff in cm^-1 below which thermo_grid treats vibrational modes as
+    # hindered rotors (quasi-RRHO), or None for the harmonic treatment. 
+    qrrho = None,
+    
+    # Properties tabulated by the props command from each geo .log file, by
+    # extractor name ('mulliken', 'loewdin', 'dipole', 's2', or any added to
+    # whaler.extractors.registry), or None for all of them. 
+    properties = None,
+    
+    # RMSD in Angstroms, after alignment, below which the dupes command
+    # takes two optimized geometries of the same composition to be the same.
+    duplicate_rmsd = 0.1,
+    
+    # Number of processes used to scan structure directories. 
+    jobs = 1,
+    
+    # I/O backend for scanning: 'async' keeps up to io_limit listdir, stat and
+    # read calls in flight at once, hiding the latency of network
+    # filesystems; 'sync' issues them one at a time; 'auto' uses 'async' when
+    # a campaign root is on a network filesystem (NFS, Lustre, ...). 
+    io = 'auto',
+    io_limit = 32,
     
-    )
\ No newline at end of file
+    # Seconds between polls of the structure directories in watch mode. 
+    watch_interval = 30,
+    )
+
+filegen = dict(
+    # Manifest of the hashes of generated files, used to skip rewriting
+    # files whose content has not changed. 
+    manifest = '.whaler_manifest.json',
+    
+    # Number of threads used to write the generated files. 
+    workers = 8,
+    )
+
+server = dict(
+    # Address of the query server (whaler serve): the path of a Unix socket,
+    # relative to the output location, or 'host:port' to listen on TCP. 
+    address = 'whaler.sock',
+    
+    # Seconds between checks for changed logs, and seconds a client waits
+    # for a reply. 
+    refresh_interval = 2,
+    timeout = 60,
+    )
+
+profile = dict(
+    # Report written by the --profile option to config.path['output'], and
+    # the number of slowest log files it lists. 
+    report = 'whaler_profile.json',
+    top = 10,
+    )
@@ -1,43 +1,57 @@
 """A module containing analytical objects specific to a particular experiment. 
 """
-import os
 import numpy as np
 import pandas as pd
 from whaler.analysis import Analysis
+from whaler.dataprep import LogScan
+from whaler.network import Network
+from whaler.profiling import profile
 
 class Reactions():
     """
     """
-    def __init__(self):
-        self.A = Analysis()
+    def __init__(self, refresh=False, jobs=None, only=None):
+        # N2 is the reference for every reaction, so it is always selected.
+        if only:
+            only = list(only) + ['N2']
+        self.A = Analysis(refresh, jobs, only)
         
         # Analysis output filenames. 
-        self.crude_N2_out = "crudeN2_Es.csv"
-        self.N2_act_out = "N2_act_Es.csv"
-        self.N2_bond_out = "N2_act_bonds.csv"
+        self.crude_N2_out = self.A.outname("crudeN2_Es")
+        self.N2_act_out = self.A.outname("N2_act_Es")
+        self.N2_bond_out = self.A.outname("N2_act_bonds")
         
         # Physical constants.
         self.kB = 3.1668114/1000000
         self.temp = 298.15
         self.kcal_eH = 627.509
+        
+        # Reactions of each M2(L)4 structure with N2, by stoichiometry. 
+        self.N2_reactions = {
+            'Add N2' : {'{}N2':1, '{}':-1, 'N2':-1},
+            'Add N' : {'{}N':2, '{}':-2, 'N2':-1},
+            }
     
     def write_crude_N2(self):
         """
         """
-        self.A.write_data(
-            "cruderxn", self.crude_N2_out, self.crude_N2_act(), format='%.1f')
+        with profile.stage('tabulate'):
+            data = self.crude_N2_act()
+        self.A.write_data("cruderxn", self.crude_N2_out, data, format='%.1f')
     
     def write_N2_act(self):
         """
         """
-        self.A.write_data(
-            "N2act", self.N2_act_out, self.therm_N2_act(), format='%.1f')
+        with profile.stage('tabulate'):
+            data = self.therm_N2_act()
+        self.A.write_data("N2act", self.N2_act_out, data, format='%.1f')
     
     def write_N2_bonds(self):
         """
         """
-        self.A.write_data(
-            "bonds", self.N2_bond_out, self.MMN2_bonds(), format='%.3f')
+        with profile.stage('tabulate'):
+            data = self.MMN2_bonds()
+        self.A.write_data("bonds", self.N2_bond_out, data, format='%.3f')
     
     def MMN2_bonds(self):
         """Tabulates the M-M, M-N, and N-N bond lengths in M2(L)4, M2(L)4N, and 
@@ -59,51 +73,33 @@ class Reactions():
             for struct in short_gEs.index if struct[-3:] == '4N2'
             }
         
-        # Acquire bond lengths. 
-        
-        gs_M_M = {
-            struct : self.A.bondlength(struct, state, 'M', 'M', 'z')
-            for struct,state in base_structs.items()
-            }
-        
-        es_M_M = {
-            struct : self.A.bondlength(struct,
-                                        self.A.spinflip[state], 'M', 'M', 'z')
-            for struct,state in base_structs.items()
-            }
-        
-        gs_M_MN = {
-            struct[:-1] : self.A.bondlength(struct, state, 'M', 'M', 'z')
-            for struct,state in N_structs.items()
-            }
-        
-        gs_M_MN2 = {
-            struct[:-2] : self.A.bondlength(struct, state, 'M', 'M', 'z')
-            for struct,state in N2_structs.items()
-            }
-        
-        gs_M2_N = {
-            struct[:-1] : self.A.bondlength(struct, state, 'M', 'N', 'z')
-            for struct,state in N_structs.items()
-            }
-        
-        gs_M2_N2 = {
-            struct[:-2] : self.A.bondlength(struct, state, 'M', 'N', 'z', 1)
-            for struct,state in N2_structs.items()
-            }
+        # Acquire bond lengths, as (column, row, bondlength arguments).
+        flip = self.A.spinflip
+        bonds = (
+            [('M-M gs', struct, (struct, state, 'M', 'M', 'z', 0))
+                for struct,state in base_structs.items()]
+            + [('M-M es', struct, (struct, flip[state], 'M', 'M', 'z', 0))
+                for struct,state in base_structs.items()]
+            + [('M-MN', struct[:-1], (struct, state, 'M', 'M', 'z', 0))
+                for struct,state in N_structs.items()]
+            + [('M-MN2', struct[:-2], (struct, state, 'M', 'M', 'z', 0))
+                for struct,state in N2_structs.items()]
+            + [('M2-N', struct[:-1], (struct, state, 'M', 'N', 'z', 0))
+                for struct,state in N_structs.items()]
+            + [('M2-N2', struct[:-2], (struct, state, 'M', 'N', 'z', 1))
+                for struct,state in N2_structs.items()]
+            + [('M2N-N', struct[:-2], (struct, state, 'N', 'N', 'z', 0))
+                for struct,state in N2_structs.items()]
+            )
         
-        gs_M2N_N = {
-            struct[:-2] : self.A.bondlength(struct, state, 'N', 'N', 'z')
-            for struct,state in N2_structs.items()
-            }
+        lengths = self.A.bondlengths([args for col,row,args in bonds])
         
         # Construct the data table. 
         headers = [
             'M-M gs', 'M-M es', 'M-MN2', 'M2-N2', 'M2N-N', 'M-MN', 'M2-N']
-        results = [
-            gs_M_M, es_M_M, gs_M_MN2, gs_M2_N2, gs_M2N_N, gs_M_MN, gs_M2_N]
-        
-        resultsdict = {k:v for k,v in zip(headers, results)}
+        resultsdict = {k:{} for k in headers}
+        for (col, row, args), length in zip(bonds, lengths):
+            resultsdict[col][row] = length
         
         lengths = pd.DataFrame.from_dict(data=resultsdict, orient='columns')
         lengths = lengths[headers]
@@ -116,38 +112,14 @@ class Reactions():
         the corresponding M2(L)4N and M2(L)4N2 structures, tabulating the
         results in kcal/mol.
         """
-        # Make a dictionary of all structures with ground state energies. 
+        # Take the lowest energy of each structure, over its spin states. 
         short_gEs = self.A.gEs.dropna(axis=0, how='all')
-        struct_Es = {
-            struct : short_gEs.loc[struct][:-1].min()
-            for struct in short_gEs.index}
-        
-        # Calculate the energy differences. 
-        structs = []
-        nitride = []
-        nitrogen = []
-        
-        N2_E = self.A.finalE("N2_4Sgeo.log", os.path.join(self.A.loc, "N2"))
-        
-        for k,v in struct_Es.items():
-            structs.append(k)
-            try:
-                nitride.append(struct_Es[k + 'N']*2 - v*2 - N2_E)
-            except:
-                nitride.append(np.nan)
-            try:
-                nitrogen.append(struct_Es[k + 'N2'] - v - N2_E)
-            except:
-                nitrogen.append(np.nan)
-        
-        # Tabulate the data. 
-        headers = ['Add N2', 'Add N']
-        results = np.array([nitrogen, nitride]).T
-        rxn_Es = pd.DataFrame(data=results, index=structs, columns=headers)
-        rxn_Es = rxn_Es.dropna(axis=0, how='all')
+        struct_Es = short_gEs.iloc[:, :-1].min(axis=1)
         
-        print(rxn_Es.sort_values('Add N')*self.kcal_eH)
-        return rxn_Es*self.kcal_eH
+        struct_Es['N2'] = self.A.finalE(LogScan("N2_4Sgeo.log",
+                                        self.A.path("N2")))
+        
+        return self.N2_act(struct_Es)
         
     def therm_N2_act(self):
         """Subtracts the thermodynamically-corrected energy of each M2(L)4
@@ -172,29 +144,29 @@ class Reactions():
         # G = H - T*S
         therm['G'] = therm['H'] - therm['S*T (tot)']
         
-        # Calculate the energy differences. 
-        structs = []
-        nitride = []
-        nitrogen = []
-        
-        N2_G = therm.loc['N2','G']
-        
-        for base in therm.index:
-            structs.append(base)
-            base_G = therm.loc[base, 'G']
-            try:
-                nitride.append(therm.loc[base + 'N', 'G']*2 - base_G*2 - N2_G)
-            except KeyError:
-                nitride.append(np.nan)
-            try:
-                nitrogen.append(therm.loc[base + 'N2', 'G'] - base_G - N2_G)
-            except KeyError:
-                nitrogen.append(np.nan)
-        
-        # Tabulate the data. 
-        headers = ['Add N2', 'Add N']
-        results = np.array([nitrogen, nitride]).T
-        rxn_Es = pd.DataFrame(data=results, index=structs, columns=headers)
+        return self.N2_act(therm['G'])
+    
+    def N2_act_grid(self, T, p=1.0, qrrho=None):
+        """Evaluates the N2 reactions of every structure from free energies
+        recomputed over a grid of temperatures (K) and pressures (atm).
+        Returns a reaction:array dictionary of (structures, T, p) arrays, in
+        kcal/mol, with the structures listed under 'structs'.
+        """
+        grid = self.A.thermo_grid(T, p, self.symm, qrrho)
+        network = Network(self.N2_reactions, grid['structs'])
+        rxn_Gs = network.evaluate_array(grid['G'])*self.kcal_eH
+        
+        results = {
+            name:rxn_Gs[:, i] for i, name in enumerate(network.names)}
+        results['structs'] = grid['structs']
+        return results
+    
+    def N2_act(self, energies):
+        """Evaluates the N2 reactions of every structure from a Series of
+        structure energies, tabulating the results in kcal/mol.
+        """
+        network = Network(self.N2_reactions, energies.index)
+        rxn_Es = network.evaluate(energies)
         rxn_Es = rxn_Es.dropna(axis=0, how='all')
         
         print(rxn_Es.sort_values('Add N')*self.kcal_eH)
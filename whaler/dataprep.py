@@ -5,33 +5,95 @@ and put it into numpy arrays to be usable by other functions.
 
 import os
 import re
+import collections
+import json
+import mmap
+import time
+import gzip
+import lzma
 import numpy as np
+from . import extractors
+from .profiling import profile
+
+# Extensions of the compressed log formats that can be read transparently.
+compressions = ('.gz', '.xz', '.zst')
+
+def open_log(fn, mode='rb', encoding=None):
+    """Opens a plain or compressed file for reading, decompressing it as it
+    is read. 
+    """
+    if fn.endswith('.gz'):
+        return gzip.open(fn, mode, encoding=encoding)
+    elif fn.endswith('.xz'):
+        return lzma.open(fn, mode, encoding=encoding)
+    elif fn.endswith('.zst'):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError(
+                "Reading %s requires the zstandard package." % fn)
+        return zstandard.open(fn, mode, encoding=encoding)
+    else:
+        return open(fn, mode, encoding=encoding)
+
+def strip_compression(file):
+    """Gives a filename without its compression extension, if it has one.
+    """
+    root, ext = os.path.splitext(file)
+    if ext in compressions:
+        return root
+    return file
 
 class IO():
     """An object that points to a desired file location and either extracts data
-    from an existing text file, or writes data to a text file. 
+    from an existing text file, or writes data to a text file. Files compressed
+    with gzip, xz or zstd are read transparently.
     """
+    # Extension of the sidecar index kept next to each compressed log, and
+    # the number of its final lines that the index keeps.
+    tail_ext = '.tail'
+    tail_lines = 10
+    
+    # Bytes decompressed at a time when indexing a compressed log.
+    chunk_bytes = 2**20
+    
     def __init__(self, filename='', dir=''):
         self.fn = os.path.join(dir, filename)
-
+        self.held = None
+        
         if os.path.exists(self.fn):
             #print("%s found." % self.fn)
             pass
         else:
             print("%s does not yet exist." % self.fn)
     
-    def get_values(self, structure, exten, filecheck, extractor):
+    def get_values(self, structure, exten, filecheck, extractor, cache=None,
+                    catalog=None, kind=None):
         """For a given structure, identifies all of the relevant, current log
-        files. Runs filecheck to verify convergence, and then uses the extractor
-        to acquire the desired values from the file. The values arereturned as a state:value dictionary. 
+        files. Each log is scanned once; filecheck is run on the scan to verify
+        convergence, and then the extractor acquires the desired values from
+        the same scan. The values are returned as a state:value dictionary. 
+        If a ParseCache is given, logs that are unchanged since they were last
+        parsed are not read again. If a Catalog is given, the files, their
+        labels and their signatures are taken from it rather than from the
+        directory. The values are cached under the given kind, or under the
+        name of the extractor.
         """
         path = self.fn
         
-        # Narrows it down to the appropriate log files.
-        logs = self.files_end_with(exten)
-        
-        # Unpacks filetypes.
-        ftypes = {file:self.getcalctype(file) for file in logs}
+        # Narrows it down to the appropriate log files, and unpacks filetypes.
+        if catalog is None:
+            logs = self.files_end_with(exten, compressed=True)
+            ftypes = {file:self.getcalctype(file) for file in logs}
+            sigs = {}
+        else:
+            logs = catalog.files(structure, exten, compressed=True)
+            entries = {file:catalog.entry(structure, file) for file in logs}
+            ftypes = {
+                file : (e.iter, e.state, e.type) if e.iter is not None
+                    else self.getcalctype(file)
+                for file, e in entries.items()}
+            sigs = {file:[e.size, e.mtime] for file, e in entries.items()}
         
         try:
             iter, state, type = (zip(*ftypes.values()))
@@ -42,9 +104,14 @@ class IO():
                 if iter[i] > stateiter[state[i]]:
                     stateiter[state[i]] = iter[i]
             
-            values = {
-                v[1]:extractor(k, path) for (k,v) in ftypes.items() 
-                if v[0] == stateiter[v[1]] and filecheck(k, path)}
+            values = {}
+            for (k,v) in ftypes.items():
+                if v[0] == stateiter[v[1]]:
+                    valid, value = self.extract(
+                                    k, filecheck, extractor, cache,
+                                    sigs.get(k), kind)
+                    if valid:
+                        values[v[1]] = value
                 
         except ValueError as e:
             if "not enough values" in str(e):
@@ -58,13 +125,49 @@ class IO():
         # Return values packed in a dictionary.
         return values
     
+    def extract(self, file, filecheck, extractor, cache=None, sig=None,
+                kind=None):
+        """Scans a single log file in this directory, returning a
+        (valid, value) pair. Uses the cache when the file is unchanged, as
+        judged by its signature (looked up unless given).
+        """
+        fn = os.path.join(self.fn, file)
+        if kind is None:
+            kind = extractor.__name__
+        
+        if cache is not None:
+            if sig is None:
+                sig = cache.signature(fn)
+            cached = cache.get(fn, kind, sig)
+            if cached is not None:
+                profile.count('cache hits')
+                return cached
+        
+        start = time.perf_counter()
+        scan = LogScan(file, self.fn)
+        with profile.stage('validate'):
+            valid = filecheck(scan)
+        with profile.stage('extract'):
+            value = extractor(scan) if valid else None
+        profile.file_time(fn, time.perf_counter() - start)
+        
+        if cache is not None:
+            cache.put(fn, kind, sig, valid, value)
+        return (valid, value)
+    
+    def scan(self):
+        """Returns a LogScan of the file, which reads its contents at most
+        once.
+        """
+        return LogScan(self.fn)
+    
     def getcalctype(self, file):
         """Takes a chemical computation file and gives the calc type labels, 
         based on the filename formulation: xxxxxxx_NSyyy.log, where x chars
         refer to the structure name, N is the iteration number, S is the spin
         state label, and yyy is the optimization type. 
         """
-        labels = file.split('_')[-1]
+        labels = strip_compression(file).split('_')[-1]
         iter = int(labels[0])
         state = labels[1]
         type = labels.split('.')[0][2:]
@@ -73,60 +176,219 @@ class IO():
     def appendline(self, line):
         """Useful for writing log files.
         """
+        if self.held is not None:
+            self.held.append(line)
+            return
         with open(self.fn, 'a') as f:
             f.write(line + '\n')
     
-    def files_end_with(self, suffix):
-        """Returns a list of files ending with the given suffix.
+    def hold(self):
+        """Holds the lines given to appendline until flush is called, so that
+        they are written with a single append.
         """
-        return list(filter(
-                        lambda file: file.endswith(suffix),
-                        os.listdir(self.fn)
-                        ))
+        if self.held is None:
+            self.held = []
     
-    def tail(self, lines=1, _buffer=4098):
+    def flush(self):
+        """Writes any held lines, and stops holding them.
+        """
+        held = self.held
+        self.held = None
+        if held:
+            with open(self.fn, 'a') as f:
+                f.write(''.join(line + '\n' for line in held))
+    
+    def files_end_with(self, suffix, compressed=False):
+        """Returns a list of files ending with the given suffix. If compressed
+        is True, compressed files whose names end with the suffix once the
+        compression extension is removed are included, unless the
+        uncompressed file is also present. 
+        """
+        with profile.stage('scan'):
+            files = os.listdir(self.fn)
+            found = [file for file in files if file.endswith(suffix)]
+            if compressed:
+                present = set(found)
+                found += [
+                    file for file in files if file != strip_compression(file)
+                    and strip_compression(file).endswith(suffix)
+                    and strip_compression(file) not in present]
+            return found
+    
+    @property
+    def compressed(self):
+        """Whether the file is compressed.
+        """
+        return self.fn != strip_compression(self.fn)
+    
+    def open(self, mode='rt'):
+        """Opens the file for reading, decompressing it if necessary.
+        """
+        if 'b' in mode:
+            return open_log(self.fn, mode)
+        return open_log(self.fn, mode, encoding='latin-1')
+    
+    def tail(self, lines=1):
         """Tail a file and get X lines from the end"""
-        with open(self.fn) as f:
+        if self.compressed:
+            if lines <= self.tail_lines:
+                return self.tail_index([])['end'][-lines:]
+            with self.open() as f:
+                tail = list(collections.deque(f, lines))
+            profile.opened(sum(len(line) for line in tail))
+            return tail
         
-            # place holder for the lines found
-            lines_found = []
-
-            # block counter will be multiplied by buffer
-            # to get the block size from the end
-            block_counter = -1
-
-            # loop until we find X lines
-            while len(lines_found) < lines:
-                try:
-                    f.seek(block_counter * _buffer, os.SEEK_END)
-                except IOError:  # either file is too small, or too many lines requested
-                    f.seek(0)
-                    lines_found = f.readlines()
-                    break
-
-                lines_found = f.readlines()
-
-                # we found enough lines, get out
-                if len(lines_found) > lines:
+        with open(self.fn, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return []
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                
+                # Step back one newline per line, ignoring the final one.
+                pos = size - 1 if mm[size-1:size] == b'\n' else size
+                for x in range(lines):
+                    pos = mm.rfind(b'\n', 0, pos)
+                    if pos < 0:
+                        break
+                tail = mm[pos+1:size].decode('latin-1')
+        
+        profile.opened(size - pos - 1)
+        return tail.splitlines(keepends=True)
+    
+    def rfind(self, markers, limit=None):
+        """Searches backwards from the end of the file for each of the given
+        byte-string markers, looking at most limit bytes from the end. Returns
+        a marker:line dictionary giving the last line containing each marker,
+        or None where it was not found. 
+        """
+        found = {marker:None for marker in markers}
+        if self.compressed:
+            index = self.tail_index(markers)
+            start = 0 if limit is None else index['size'] - limit
+            for marker in markers:
+                entry = index['markers'][marker.decode('latin-1')]
+                if entry is not None and entry[0] >= start:
+                    found[marker] = entry[1]
+            return found
+        
+        with open(self.fn, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return found
+            start = 0 if limit is None else max(0, size - limit)
+            
+            # Earliest position reached by any of the searches.
+            searched = size
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for marker in markers:
+                    i = mm.rfind(marker, start)
+                    if i < 0:
+                        searched = start
+                        continue
+                    searched = min(searched, i)
+                    linestart = mm.rfind(b'\n', 0, i) + 1
+                    lineend = mm.find(b'\n', i)
+                    if lineend < 0:
+                        lineend = size
+                    found[marker] = mm[linestart:lineend].decode('latin-1')
+        
+        profile.opened(size - searched)
+        return found
+    
+    def tail_index(self, markers):
+        """Returns the sidecar index of a compressed file: its decompressed
+        size, its final lines, and the [offset, line] of the last occurrence
+        of each of the given byte-string markers (or None). The index is
+        rebuilt, in a single streaming pass, only when the file has changed
+        or a marker is requested that it does not yet cover. 
+        """
+        fn = self.fn + self.tail_ext
+        stat = os.stat(self.fn)
+        sig = [stat.st_size, stat.st_mtime_ns]
+        names = [marker.decode('latin-1') for marker in markers]
+        
+        index = None
+        try:
+            with open(fn, "rt") as f:
+                index = json.load(f)
+            profile.opened(os.path.getsize(fn))
+        except (OSError, ValueError):
+            pass
+        if (index is not None and index['sig'] == sig
+                and all(name in index['markers'] for name in names)):
+            return index
+        
+        # Index the requested markers along with those already indexed.
+        if index is not None:
+            names = sorted(set(names) | set(index['markers']))
+        index = self.index_tail([name.encode('latin-1') for name in names])
+        index['sig'] = sig
+        try:
+            temp = fn + '.tmp'
+            with open(temp, "wt") as f:
+                json.dump(index, f)
+            os.replace(temp, fn)
+        except OSError:
+            pass
+        return index
+    
+    def index_tail(self, markers):
+        """Decompresses the file in chunks, keeping only its final lines and
+        the last line containing each marker.
+        """
+        found = {marker:None for marker in markers}
+        recent = b''
+        carry = b''
+        offset = 0
+        
+        with self.open('rb') as f:
+            while True:
+                chunk = f.read(self.chunk_bytes)
+                if not chunk:
+                    block = carry
+                else:
+                    # Search whole lines only, carrying the partial last
+                    # line over to the next chunk.
+                    buf = carry + chunk
+                    cut = buf.rfind(b'\n') + 1
+                    block, carry = buf[:cut], buf[cut:]
+                
+                for marker in markers:
+                    i = block.rfind(marker)
+                    if i < 0:
+                        continue
+                    linestart = block.rfind(b'\n', 0, i) + 1
+                    lineend = block.find(b'\n', i)
+                    if lineend < 0:
+                        lineend = len(block)
+                    found[marker] = [
+                        offset + i,
+                        block[linestart:lineend].decode('latin-1')]
+                
+                offset += len(block)
+                recent = (recent + block)[-self.chunk_bytes:]
+                if not chunk:
                     break
-
-                # decrement the block counter to get the
-                # next X bytes
-                block_counter -= 1
-
-        return lines_found[-lines:]
+        
+        profile.opened(offset)
+        end = recent.decode('latin-1').splitlines(keepends=True)
+        return {
+            'size':offset, 'end':end[-self.tail_lines:],
+            'markers':{m.decode('latin-1'):v for m,v in found.items()}}
     
     def head(self, lines=1):
         """Head a file and get X lines from the beginning"""
-        with open(self.fn) as f:
+        with self.open() as f:
             head = [next(f) for x in range(lines)]
+        profile.opened(sum(len(line) for line in head))
         return head
     
     def lines(self):
         """Gives all lines from a file as a list"""
-        with open(self.fn, "rt", encoding='latin-1') as f:
-            lines = f.read().splitlines()
-        return list(lines)
+        with self.open() as f:
+            text = f.read()
+        profile.opened(len(text))
+        return text.splitlines()
     
     def replace_vals(self, starttxt, endtxt, outfile):
         """Replaces all instances of starttxt with endtxt, printing the file as
@@ -148,9 +410,694 @@ class IO():
                         line = line.replace(old, new)
                     fout.write(line)
 
+class LogScan():
+    """The contents of an ORCA .log file needed to validate the calculation
+    and extract its values. The termination status, optimization markers and
+    final energy all sit near the end of the file, and are found with a single
+    bounded reverse search. The numfreq error marker and the vibrational and
+    thermochemistry blocks require a full pass, which is only made when one of
+    them is requested. Compressed logs are read through IO, whose tail index
+    avoids decompressing them again for the end-of-run markers.
+    """
+    # Bytes from the end of the file searched for end-of-run markers.
+    tail_bytes = 2**20
+    
+    energy_marker = b'FINAL SINGLE POINT ENERGY'
+    optdone_marker = b'*** OPTIMIZATION RUN DONE ***'
+    warning_marker = b'WARNING!!!!!!!'
+    
+    # Fields of the records given by cycles().
+    cycle_fields = (
+        'cycle', 'energy', 'energy change', 'rms gradient', 'max gradient',
+        'rms step', 'max step')
+    
+    def __init__(self, filename='', dir=''):
+        self.fn = os.path.join(dir, filename)
+        self.file = os.path.basename(self.fn)
+        self._tail_read = False
+        self._full_read = False
+    
+    @property
+    def end(self):
+        """The last two lines of the file, as given by IO.tail(2).
+        """
+        self.read_tail()
+        return self._end
+    
+    @property
+    def optdone(self):
+        self.read_tail()
+        return self._optdone
+    
+    @property
+    def optwarning(self):
+        self.read_tail()
+        return self._optwarning
+    
+    @property
+    def energy(self):
+        """The last final single point energy. Once the whole file has been
+        read, it is taken from that pass, since the energy of a frequency
+        calculation is printed before blocks that can outgrow the tail.
+        """
+        if self._full_read:
+            return self._read_energy
+        self.read_tail()
+        return self._energy
+    
+    @property
+    def numfreq_error(self):
+        self.read()
+        return self._numfreq_error
+    
+    @property
+    def vib_lines(self):
+        self.read()
+        return self._vib_lines
+    
+    @property
+    def therm_lines(self):
+        self.read()
+        return self._therm_lines
+    
+    @property
+    def temperature(self):
+        """The temperature in K of the thermochemistry, or NaN.
+        """
+        return self.condition('Temperature')
+    
+    @property
+    def pressure(self):
+        """The pressure in atm of the thermochemistry, or NaN.
+        """
+        return self.condition('Pressure')
+    
+    def condition(self, name):
+        self.read()
+        line = self._conditions.get(name)
+        if line is None:
+            return np.nan
+        return extract_floats(line)[0]
+    
+    @property
+    def frequencies(self):
+        """Array of all vibrational frequencies in cm^-1, in mode order.
+        """
+        lines = self.vib_lines
+        if not lines:
+            return np.zeros(0)
+        return np.array(
+            [line.split()[1] for line in lines if line.strip()], dtype=float)
+    
+    @property
+    def ir_spectrum(self):
+        """Returns (modes, intensities): the mode numbers and IR intensities
+        (the T**2 column, or Int where ORCA prints it) of the IR spectrum.
+        """
+        self.read()
+        header = self._ir_header
+        lines = self._ir_lines
+        if not lines:
+            return (np.zeros(0, dtype=int), np.zeros(0))
+        
+        # Column of the intensity, counting from the first number after the
+        # mode label.
+        col = 1
+        if header is not None:
+            names = header.replace('freq (cm**-1)', 'freq').split()[1:]
+            if 'Int' in names:
+                col = names.index('Int')
+            elif 'T**2' in names:
+                col = names.index('T**2')
+        
+        table = [line.replace(':', ' ').replace('(', ' ').split()
+                    for line in lines]
+        modes = np.array([row[0] for row in table], dtype=int)
+        intensities = np.array([row[col + 1] for row in table], dtype=float)
+        return (modes, intensities)
+    
+    @property
+    def normal_modes(self):
+        """(3N, modes) array of the mass-weighted normal mode displacements,
+        with one column per vibrational mode.
+        """
+        self.read()
+        columns = {}
+        current = []
+        for line in self._modes_lines or []:
+            fields = line.split()
+            if not fields:
+                continue
+            try:
+                if all('.' not in f for f in fields):
+                    current = [int(f) for f in fields]
+                    continue
+                row = int(fields[0])
+                values = [float(f) for f in fields[1:]]
+            except ValueError:
+                continue
+            for col, value in zip(current, values):
+                columns.setdefault(col, {})[row] = value
+        
+        if not columns:
+            return np.zeros((0, 0))
+        nrows = max(max(c) for c in columns.values()) + 1
+        modes = np.zeros((nrows, len(columns)))
+        for j, col in enumerate(sorted(columns)):
+            for row, value in columns[col].items():
+                modes[row, j] = value
+        return modes
+    
+    def spectrum(self, modes=False):
+        """Returns a dictionary of arrays describing the vibrational spectrum:
+        frequencies, IR mode numbers and intensities, and optionally the
+        normal mode displacements. 
+        """
+        ir_modes, intensities = self.ir_spectrum
+        arrays = {
+            'frequencies':self.frequencies, 'ir_modes':ir_modes,
+            'ir_intensities':intensities}
+        if modes:
+            arrays['normal_modes'] = self.normal_modes
+        return arrays
+    
+    def cycles(self):
+        """Generates a record for each cycle of a geometry optimization: its
+        number, energy, and the energy change, gradients and steps of its
+        convergence table (NaN where missing). The file is streamed, so only
+        the current cycle is held in memory.
+        """
+        record = None
+        converging = False
+        with IO(self.fn).open() as f:
+            for line in f:
+                if 'GEOMETRY OPTIMIZATION CYCLE' in line:
+                    if record is not None:
+                        yield record
+                    record = dict.fromkeys(self.cycle_fields, np.nan)
+                    record['cycle'] = int(line.split('CYCLE')[1].split()[0])
+                    converging = False
+                elif record is None:
+                    continue
+                elif line.startswith('FINAL SINGLE POINT ENERGY'):
+                    # The energies after the convergence table belong to
+                    # the next geometry, or to the final evaluation. 
+                    if not converging:
+                        record['energy'] = float(line.split()[-1])
+                elif '|Geometry convergence|' in line:
+                    converging = True
+                elif converging:
+                    fields = line.split()
+                    item = ' '.join(fields[:2]).lower()
+                    if item in record and len(fields) > 2:
+                        try:
+                            record[item] = float(fields[2])
+                        except ValueError:
+                            pass
+        if record is not None:
+            yield record
+    
+    @property
+    def trajectory(self):
+        """The optimization cycles of the log, as a field:array dictionary.
+        """
+        records = list(self.cycles())
+        return {
+            field:np.array([r[field] for r in records], dtype=float)
+            for field in self.cycle_fields}
+    
+    def properties(self, names=None):
+        """Runs the named property extractors (or every registered one) over
+        the file in a single streaming pass, returning a name:value
+        dictionary of the properties found.
+        """
+        with IO(self.fn).open() as f:
+            values = extractors.scan(f, names)
+        profile.opened(os.path.getsize(self.fn))
+        return values
+    
+    @property
+    def status(self):
+        """Gives 'normal', 'aborted', or 'unknown', based on the end of the
+        file.
+        """
+        if 'ABORTING THE RUN\n' in self.end:
+            return 'aborted'
+        elif self.end and 'ORCA TERMINATED NORMALLY' in self.end[0]:
+            return 'normal'
+        else:
+            return 'unknown'
+    
+    def read_tail(self):
+        """Searches backwards from the end of the file for the end-of-run
+        markers.
+        """
+        if self._tail_read:
+            return
+        reader = IO(self.fn)
+        
+        # The markers are searched first, so that a compressed file's tail
+        # index is built once for both. 
+        found = reader.rfind(
+                    [self.energy_marker, self.optdone_marker,
+                        self.warning_marker],
+                    self.tail_bytes)
+        self._end = reader.tail(2)
+        
+        self._optdone = found[self.optdone_marker] is not None
+        warning = found[self.warning_marker]
+        self._optwarning = (
+            warning is not None and warning.strip() == 'WARNING!!!!!!!')
+        energyline = found[self.energy_marker]
+        if energyline is None:
+            self._energy = np.nan
+        else:
+            self._energy = float(energyline.split()[-1])
+        self._tail_read = True
+    
+    def read(self):
+        """Reads through the whole file line by line, marking the data
+        locations.
+        """
+        if self._full_read:
+            return
+        numfreq_marker = ("ORCA_NUMFREQ: ORCA finished with an error in the"
+                            " energy calculation")
+        vib_marker = 'VIBRATIONAL FREQUENCIES'
+        modes_marker = 'NORMAL MODES'
+        ir_marker = 'IR SPECTRUM'
+        therm_marker = 'INNER ENERGY'
+        therm_length = 69
+        
+        self._numfreq_error = False
+        self._vib_lines = None
+        self._therm_lines = None
+        self._modes_lines = None
+        self._ir_header = None
+        self._ir_lines = None
+        self._conditions = {}
+        self._read_energy = np.nan
+        vib = None
+        modes = None
+        ir = None
+        therm = None
+        
+        with IO(self.fn).open() as f:
+            for line in f:
+                text = line.rstrip('\n')
+                
+                # Collect the block following the thermochemistry marker.
+                if therm is not None and len(therm) < therm_length:
+                    therm.append(text)
+                
+                # Collect the IR spectrum table until the first blank line
+                # after its data.
+                if ir is not None:
+                    if ':' in text and text.split(':')[0].strip().isdigit():
+                        ir.append(text)
+                    elif 'freq' in text and 'Mode' in text:
+                        self._ir_header = text
+                    elif ir and not text.strip():
+                        self._ir_lines = ir
+                        ir = None
+                
+                # Collect the normal modes until the next section.
+                if modes is not None:
+                    if text in (ir_marker, therm_marker):
+                        self._modes_lines = modes
+                        modes = None
+                    else:
+                        modes.append(text)
+                
+                if text == vib_marker:
+                    vib = []
+                elif text == modes_marker:
+                    if vib is not None:
+                        self._vib_lines = vib[2:-3]
+                    vib = None
+                    modes = []
+                elif text == ir_marker:
+                    ir = []
+                elif text == therm_marker:
+                    therm = [text]
+                    self._therm_lines = therm
+                elif text == numfreq_marker:
+                    self._numfreq_error = True
+                elif text.startswith('FINAL SINGLE POINT ENERGY'):
+                    self._read_energy = float(text.split()[-1])
+                elif vib is not None:
+                    vib.append(text)
+                elif text.startswith(('Temperature ', 'Pressure ')):
+                    self._conditions[text.split()[0]] = text
+        
+        profile.opened(os.path.getsize(self.fn))
+        if self._therm_lines is not None and (
+                len(self._therm_lines) < therm_length):
+            self._therm_lines = None
+        if ir:
+            self._ir_lines = ir
+        self._full_read = True
+
+class ParseCache():
+    """A sidecar index of the values extracted from log files, keyed by
+    extractor and file path. An entry is reused until the size or mtime of
+    its log changes. 
+    
+    The values of the bulky kinds (arrays such as trajectories, frequencies
+    and populations) are kept in a file of their own next to the index, named
+    after the kind, which is only read and written when that kind is used. A
+    kind may carry a version after a colon, as in 'prop_vals:dipole,s2'; the
+    values of an older version are dropped.
+    """
+    version = 2
+    
+    def __init__(self, filename='', dir='', bulky=()):
+        self.fn = os.path.join(dir, filename)
+        self.dir = os.path.dirname(os.path.abspath(self.fn))
+        self.bulky = set(bulky)
+        self.entries = {}
+        self.updates = {}
+        self.changed = set()
+        self.opened = set()
+        self.cleared = False
+        self.load()
+    
+    def key(self, fn):
+        """Gives the index key for a log file.
+        """
+        return os.path.relpath(os.path.abspath(fn), self.dir)
+    
+    def base(self, kind):
+        """Gives the name of a kind without its version.
+        """
+        return kind.split(':')[0]
+    
+    def shelf(self, base):
+        """Gives the filename holding the values of a bulky kind.
+        """
+        root, ext = os.path.splitext(self.fn)
+        return root + '.' + base + (ext or '.json')
+    
+    def signature(self, fn):
+        """Gives the (size, mtime) pair used to detect changed files.
+        """
+        stat = os.stat(fn)
+        return [stat.st_size, stat.st_mtime_ns]
+    
+    def get(self, fn, kind, sig):
+        """Returns the cached (valid, value) pair for a file, or None if the
+        file is not cached or has changed since.
+        """
+        entry = self.open(kind).get(self.key(fn))
+        if entry is None or entry['sig'] != sig:
+            return None
+        return (entry['valid'], entry['value'])
+    
+    def put(self, fn, kind, sig, valid, value):
+        """Stores the values extracted from a file.
+        """
+        entry = {'sig':sig, 'valid':valid, 'value':value}
+        self.open(kind)[self.key(fn)] = entry
+        self.updates.setdefault(kind, {})[self.key(fn)] = entry
+        self.changed.add(self.base(kind))
+    
+    def drain(self):
+        """Returns the entries stored since the last drain, so that they can be
+        merged into the cache of another process.
+        """
+        updates = self.updates
+        self.updates = {}
+        return updates
+    
+    def update(self, updates):
+        """Merges entries drained from another cache.
+        """
+        for kind, entries in updates.items():
+            self.open(kind).update(entries)
+            self.changed.add(self.base(kind))
+    
+    def clear(self):
+        """Forces every file to be parsed again.
+        """
+        self.changed.update(self.base(kind) for kind in self.entries)
+        self.entries = {}
+        self.opened = set(self.bulky)
+        self.cleared = True
+    
+    def open(self, kind):
+        """Returns the entries of a kind, reading them from the file of a
+        bulky kind on first use. Entries of other versions are dropped.
+        """
+        base = self.base(kind)
+        if base in self.bulky and base not in self.opened:
+            self.opened.add(base)
+            try:
+                with open(self.shelf(base), "rt") as f:
+                    stored = json.load(f)
+                # Entries stored meanwhile by another thread are kept.
+                entries = self.entries.setdefault(stored['kind'], {})
+                for key, entry in stored['entries'].items():
+                    entries.setdefault(key, entry)
+            except (OSError, ValueError, KeyError, TypeError, AttributeError):
+                pass
+        for other in [k for k in self.entries
+                        if k != kind and self.base(k) == base]:
+            del self.entries[other]
+            self.changed.add(base)
+        return self.entries.setdefault(kind, {})
+    
+    def load(self):
+        """Reads the index from disk, if it exists. An index written in an
+        older format is discarded.
+        """
+        try:
+            with open(self.fn, "rt") as f:
+                stored = json.load(f)
+            if stored.get('version') != self.version:
+                raise ValueError("outdated cache")
+            self.entries = stored['kinds']
+        except (OSError, ValueError, KeyError, AttributeError):
+            self.entries = {}
+    
+    def dump(self, fn, data):
+        """Writes a JSON file through a temporary file, so that it is never
+        left half-written.
+        """
+        temp = fn + '.tmp'
+        with open(temp, "wt") as f:
+            json.dump(data, f)
+        os.replace(temp, fn)
+    
+    def save(self):
+        """Writes the index, and the files of the bulky kinds, to disk if
+        anything in them has changed.
+        """
+        if not self.changed and not self.cleared:
+            return
+        shared = {}
+        for kind, entries in self.entries.items():
+            base = self.base(kind)
+            if base not in self.bulky:
+                shared[kind] = entries
+            elif base in self.changed:
+                self.dump(self.shelf(base), {'kind':kind, 'entries':entries})
+        
+        # Cleared bulky kinds that were not parsed again are removed.
+        if self.cleared:
+            for base in self.bulky - {self.base(k) for k in self.entries}:
+                if os.path.exists(self.shelf(base)):
+                    os.remove(self.shelf(base))
+        if self.changed - self.bulky or self.cleared:
+            self.dump(self.fn, {'version':self.version, 'kinds':shared})
+        self.changed = set()
+        self.cleared = False
+
+class CoordStore():
+    """A packed binary store of the coordinates from the .xyz files of a whole
+    campaign. The coordinates are kept as float64 (x, y, z) rows in a single
+    file that is memory-mapped for reading, with an index giving the row
+    offset, atom count and element labels for each (structure, spin state,
+    calc type). Only the latest iteration of each is stored.
+    """
+    def __init__(self, filename='', dir=''):
+        self.fn = os.path.join(dir, filename)
+        self.datafile = self.fn + '.bin'
+        self.indexfile = self.fn + '.json'
+        self.index = {}
+        self.rows = 0
+        self._data = None
+        self.load()
+    
+    def __getstate__(self):
+        # The memory map is reopened on demand rather than pickled. 
+        state = self.__dict__.copy()
+        state['_data'] = None
+        return state
+    
+    def key(self, struct, state, type):
+        """Gives the index key for a structure, spin state and calc type.
+        """
+        return "{0}:{1}{2}".format(struct, state, type)
+    
+    def get(self, struct, state, type):
+        """Returns (xyzfile, elems, coords) for a stored geometry, where coords
+        is a read-only view of the memory map, or None if it is not stored.
+        """
+        entry = self.index.get(self.key(struct, state, type))
+        if entry is None:
+            return None
+        start = entry['offset']
+        coords = self.data[start:start + len(entry['elems'])]
+        return (entry['file'], np.array(entry['elems'], dtype=str), coords)
+    
+    @property
+    def data(self):
+        """The memory-mapped (rows, 3) coordinate array.
+        """
+        if self._data is None:
+            if self.rows == 0:
+                self._data = np.zeros((0, 3))
+            else:
+                self._data = np.memmap(
+                    self.datafile, dtype='<f8', mode='r', shape=(self.rows, 3))
+        return self._data
+    
+    def refresh(self, dirs, reader, catalog=None):
+        """Stores the geometries of the structures in a struct:path dictionary
+        whose .xyz files are new or have changed. reader(file, path) must
+        return the element labels and coordinate array from an .xyz file. 
+        If a Catalog is given, the directories are not listed again.
+        """
+        with profile.stage('scan'):
+            new = self.find_changed(dirs, reader, catalog)
+        if new:
+            with profile.stage('write'):
+                self.append(new)
+        if self.stale_rows() > max(self.rows // 2, 1024):
+            with profile.stage('write'):
+                self.compact()
+    
+    def find_changed(self, dirs, reader, catalog=None):
+        """Returns the (key, file, sig, elems, coords) entries for the .xyz
+        files that are new or have changed, forgetting those that are gone.
+        """
+        new = []
+        stored = {}
+        for key in self.index:
+            stored.setdefault(key.rsplit(':', 1)[0], []).append(key)
+        
+        for struct, path in dirs.items():
+            
+            # Find the latest .xyz file of each spin state and calc type.
+            # The labels are taken from the catalog when it is given.
+            latest = {}
+            if catalog is None:
+                files = os.listdir(path)
+                labeler = IO(dir=path)
+            else:
+                files = catalog.files(struct, '.xyz')
+            for file in sorted(files):
+                if not file.endswith('.xyz'):
+                    continue
+                if catalog is None:
+                    try:
+                        iter, state, type = labeler.getcalctype(file)
+                    except (ValueError, IndexError):
+                        continue
+                else:
+                    entry = catalog.entry(struct, file)
+                    if entry.iter is None:
+                        continue
+                    state, type = entry.state, entry.type
+                latest[(state, type)] = file
+            
+            # Forget the geometries that no longer exist. 
+            keys = {self.key(struct, *k):f for k,f in latest.items()}
+            for key in stored.get(struct, []):
+                if key not in keys:
+                    del self.index[key]
+            
+            for key, file in keys.items():
+                if catalog is None:
+                    stat = os.stat(os.path.join(path, file))
+                    sig = [stat.st_size, stat.st_mtime_ns]
+                else:
+                    sig = catalog.signature(struct, file)
+                entry = self.index.get(key)
+                if entry and entry['file'] == file and entry['sig'] == sig:
+                    continue
+                elems, coords = reader(file, path)
+                new.append((key, file, sig, list(elems), coords))
+        
+        return new
+    
+    def append(self, entries):
+        """Appends coordinates to the data file and records them in the index.
+        """
+        with open(self.datafile, "ab") as f:
+            for key, file, sig, elems, coords in entries:
+                coords = np.asarray(coords, dtype='<f8').reshape(-1, 3)
+                f.write(coords.tobytes())
+                self.index[key] = {
+                    'file':file, 'sig':sig, 'elems':elems, 'offset':self.rows}
+                self.rows += len(coords)
+        self._data = None
+        self.save()
+    
+    def stale_rows(self):
+        """Gives the number of rows in the data file that are no longer
+        indexed.
+        """
+        live = sum(len(entry['elems']) for entry in self.index.values())
+        return self.rows - live
+    
+    def compact(self):
+        """Rewrites the data file without its stale rows.
+        """
+        data = self.data
+        temp = self.datafile + '.tmp'
+        rows = 0
+        with open(temp, "wb") as f:
+            for entry in self.index.values():
+                start = entry['offset']
+                n = len(entry['elems'])
+                block = np.asarray(data[start:start + n], dtype='<f8')
+                f.write(block.tobytes())
+                entry['offset'] = rows
+                rows += n
+        self._data = None
+        del data
+        os.replace(temp, self.datafile)
+        self.rows = rows
+        self.save()
+    
+    def load(self):
+        """Reads the index from disk, if it exists and matches the data file.
+        """
+        try:
+            self.rows = os.path.getsize(self.datafile) // 24
+            with open(self.indexfile, "rt") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        
+        # An index that does not match the data file is discarded, leaving
+        # the existing rows to be compacted away.
+        if saved['rows'] == self.rows:
+            self.index = saved['index']
+    
+    def save(self):
+        """Writes the index to disk.
+        """
+        temp = self.indexfile + '.tmp'
+        with open(temp, "wt") as f:
+            json.dump({'rows':self.rows, 'index':self.index}, f)
+        os.replace(temp, self.indexfile)
+
 def extract_floats(str):
     """Takes a string and returns a list of floats in that string.
     """
+    profile.count('float extractions')
     return [float(n) for n in re.findall(r"[-+]?\d*\.\d+|\d+", str)]
 
 def dict_values(dicts):
@@ -0,0 +1,190 @@
+"""
+This module contains the registry of property extractors, which read sections
+of ORCA .log files such as the population analyses, the dipole moment and
+<S**2>. Each extractor subscribes to the lines that open its section, so that
+every registered property is collected in a single streaming pass over a log.
+
+A new property is added by registering a subclass of Extractor:
+    
+    @register
+    class Hirshfeld(Populations):
+        name = 'hirshfeld'
+        markers = ('HIRSHFELD ANALYSIS',)
+"""
+
+import re
+
+# Extractor classes, by property name.
+registry = {}
+
+def register(cls):
+    """Adds an Extractor class to the registry, under its name.
+    """
+    registry[cls.name] = cls
+    return cls
+
+class Extractor():
+    """Reads one property from the sections of a log opened by its markers.
+    A section that appears several times, as in each cycle of an
+    optimization, is read again each time, so the last one is kept.
+    
+    The value is a dictionary of the element of each row (or None for a
+    property of the whole molecule), the column names, and the rows of
+    values.
+    """
+    name = None
+    markers = ()
+    columns = ()
+    
+    def __init__(self):
+        self.elements = None
+        self.rows = None
+    
+    def start(self, line):
+        """Begins a new section at the line holding its marker.
+        """
+        self.elements = None
+        self.rows = []
+    
+    def feed(self, line):
+        """Reads a line of the section, returning False once the section has
+        ended.
+        """
+        return False
+    
+    def value(self):
+        if not self.rows:
+            return None
+        return {
+            'elements':self.elements, 'columns':list(self.columns),
+            'values':self.rows}
+
+class Populations(Extractor):
+    """Atomic charges, and spin populations for open-shell calculations, from
+    a table of 'index element: charge [spin]' lines.
+    """
+    atom_line = re.compile(
+        r'\s*(\d+)\s*([A-Za-z]+)\s*:((?:\s+-?\d+\.\d+)+)\s*$')
+    
+    def start(self, line):
+        self.elements = []
+        self.rows = []
+        self.columns = ('charge', 'spin') if 'SPIN' in line else ('charge',)
+        self.skipped = 0
+    
+    def feed(self, line):
+        match = self.atom_line.match(line)
+        if match is None:
+            # The table is preceded by a rule, and ends at the first line
+            # that is not an atom.
+            self.skipped += 1
+            return not self.rows and self.skipped < 3
+        self.elements.append(match.group(2))
+        self.rows.append([float(v) for v in match.group(3).split()])
+        return True
+
+@register
+class Mulliken(Populations):
+    name = 'mulliken'
+    markers = (
+        'MULLIKEN ATOMIC CHARGES AND SPIN POPULATIONS',
+        'MULLIKEN ATOMIC CHARGES')
+
+@register
+class Loewdin(Populations):
+    name = 'loewdin'
+    markers = (
+        'LOEWDIN ATOMIC CHARGES AND SPIN POPULATIONS',
+        'LOEWDIN ATOMIC CHARGES')
+
+@register
+class Dipole(Extractor):
+    """The total dipole moment in a.u., and its magnitude in Debye.
+    """
+    name = 'dipole'
+    markers = ('Total Dipole Moment',)
+    columns = ('x', 'y', 'z', 'magnitude')
+    
+    def start(self, line):
+        self.elements = None
+        self.vector = [float(v) for v in line.split(':')[1].split()]
+        self.rows = []
+        self.read = 0
+    
+    def feed(self, line):
+        if line.lstrip().startswith('Magnitude (Debye)'):
+            self.rows = [self.vector + [float(line.split(':')[1])]]
+            return False
+        self.read += 1
+        return self.read < 4
+
+@register
+class SpinContamination(Extractor):
+    """The expectation value of <S**2>, and its ideal value S(S+1).
+    """
+    name = 's2'
+    markers = ('Expectation value of <S**2>',)
+    columns = ('S**2', 'ideal')
+    
+    def start(self, line):
+        self.elements = None
+        self.s2 = float(line.split(':')[1])
+        self.rows = [[self.s2, float('nan')]]
+    
+    def feed(self, line):
+        if line.lstrip().startswith('Ideal value'):
+            self.rows = [[self.s2, float(line.split(':')[1])]]
+        return False
+
+def scan(lines, names=None):
+    """Runs the named extractors (or every registered one) over an iterable
+    of log lines, in a single pass. Returns a name:value dictionary of the
+    properties found.
+    """
+    if names is None:
+        names = list(registry)
+    extractors = [registry[name]() for name in names]
+    
+    # Longer markers first, so that a marker is not taken for the start of
+    # another, longer one.
+    subscribers = {}
+    for extractor in extractors:
+        for marker in extractor.markers:
+            subscribers[marker] = extractor
+    markers = sorted(subscribers, key=len, reverse=True)
+    if not markers:
+        return {}
+    opening = re.compile(
+        r'\s*(%s)' % '|'.join(re.escape(marker) for marker in markers))
+    
+    def fed(extractor, line):
+        # A section that cannot be read is dropped.
+        try:
+            return extractor.feed(line)
+        except ValueError:
+            extractor.rows = None
+            return False
+    
+    active = []
+    for line in lines:
+        if active:
+            active = [e for e in active if fed(e, line)]
+        match = opening.match(line)
+        if match is not None:
+            extractor = subscribers[match.group(1)]
+            try:
+                extractor.start(line)
+            except ValueError:
+                extractor.rows = None
+                if extractor in active:
+                    active.remove(extractor)
+                continue
+            if extractor not in active:
+                active.append(extractor)
+    
+    values = {}
+    for extractor in extractors:
+        value = extractor.value()
+        if value is not None:
+            values[extractor.name] = value
+    return values
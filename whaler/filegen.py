@@ -4,13 +4,18 @@ directories.
 """
 
 import os
+import re
 import sys
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from whaler import config
 
 class Generator():
     """An object that can generate new files based on a set of template files
     and a guide containing the desired replacements. 
     """
-    def __init__(self, guidefile):
+    def __init__(self, guidefile, dry_run=False):
         # Set the path variables and get the guide file.
         self.loc = os.getcwd()
         sys.path.append(self.loc)
@@ -33,6 +38,18 @@ class Generator():
             self.filekey = None
             self.txtkey = None
         
+        # Templates are read once, and patterns compiled once per key.
+        self.templates = None
+        self.patterns = {}
+        self.workers = config.filegen.get('workers', 8)
+        
+        # Hashes of the files written by previous runs. With dry_run, the
+        # planned changes are only reported. 
+        self.dry_run = dry_run
+        self.manifestfile = os.path.join(
+            self.loc, config.filegen.get('manifest', '.whaler_manifest.json'))
+        self.manifest = self.load_manifest()
+        
     def run(self):
         """Runs the file generation script.
         """
@@ -48,34 +65,163 @@ class Generator():
     def multi_repl(self, multikey):
         """Do ind_repl, using each key:list pair in multikey to generate 
         replacement keys at the directory, filename, and filetext levels. 
+        All of the outputs are rendered from the loaded templates, and then
+        written together.
         """
+        outputs = []
         for start,endlist in multikey.items():
             for end in endlist:
                 key = {start : end}
-                self.ind_repl(key, key, key)
+                outputs += self.render_all(key, key, key)
+        self.write_all(outputs)
     
     def ind_repl(self, dirkey, filekey, txtkey):
         """Performs all of the replacements given in the guide file.
         """
-        for dir in self.dirs:
-            for file in self.get_files(dir):
-                self.repl_file(dir, file, dirkey, filekey, txtkey)
-        
+        self.write_all(self.render_all(dirkey, filekey, txtkey))
+    
+    def render_all(self, dirkey, filekey, txtkey):
+        """Renders every template file with the given keys, returning a list
+        of (endloc, text) outputs. Outputs that would overwrite their own
+        template are left out. 
+        """
+        outputs = []
+        for dir, files in self.get_templates().items():
+            for file, text in files.items():
+                output = self.repl_file(dir, file, dirkey, filekey, txtkey)
+                if output is not None:
+                    outputs.append(output)
+        return outputs
+    
     def repl_file(self, dir, file, dirkey, filekey, txtkey):
         """Uses keys to replace strings at the directory, filename, and text 
-        levels. 
+        levels, returning the (endloc, text) output, or None if it would be
+        the template itself. 
         """
         startloc = os.path.join(self.loc, dir, file)
         newdir = self.dictreplace(dir, dirkey)
         newfile = self.dictreplace(file, filekey)
         enddir = os.path.join(self.loc, newdir)
         endloc = os.path.join(enddir, newfile)
-        if not os.path.exists(enddir):
-            os.makedirs(enddir)
         if startloc != endloc:
-            print("Reading " + startloc)
-            print("Writing " + endloc)
-            self.replace_all_vals(startloc, endloc, txtkey)
+            text = self.get_templates()[dir][file]
+            return (endloc, self.dictreplace(text, txtkey))
+        return None
+    
+    def get_templates(self):
+        """Returns a dir:{file:text} dictionary of the template files, reading
+        them from disk on first use.
+        """
+        if self.templates is None:
+            self.templates = {}
+            for dir in self.dirs:
+                self.templates[dir] = {}
+                for file in self.get_files(dir):
+                    startloc = os.path.join(self.loc, dir, file)
+                    print("Reading " + startloc)
+                    with open(startloc, "rt") as f:
+                        self.templates[dir][file] = f.read()
+        return self.templates
+    
+    def write_all(self, outputs):
+        """Writes the rendered (endloc, text) outputs whose content has
+        changed, using a pool of worker threads. Unchanged files are not
+        touched. 
+        """
+        # Later outputs to the same location take precedence.
+        outputs = dict(outputs)
+        
+        creates = []
+        updates = []
+        for endloc, text in outputs.items():
+            action = self.plan(endloc, text)
+            if action == 'create':
+                creates.append((endloc, text))
+            elif action == 'update':
+                updates.append((endloc, text))
+        unchanged = len(outputs) - len(creates) - len(updates)
+        
+        if self.dry_run:
+            for endloc, text in creates:
+                print("Would create " + endloc)
+            for endloc, text in updates:
+                print("Would update " + endloc)
+            print("Dry run: {0} to create, {1} to update, {2} unchanged."
+                    .format(len(creates), len(updates), unchanged))
+            return
+        
+        changes = creates + updates
+        for enddir in {os.path.dirname(endloc) for endloc, text in changes}:
+            if not os.path.exists(enddir):
+                os.makedirs(enddir)
+        
+        with ThreadPoolExecutor(max(1, self.workers)) as pool:
+            for endloc in pool.map(self.write_file, changes):
+                print("Writing " + endloc)
+        
+        for endloc, text in changes:
+            self.record(endloc, self.digest(text))
+        self.save_manifest()
+        print("Wrote {0} files; {1} unchanged.".format(len(changes), unchanged))
+    
+    def plan(self, endloc, text):
+        """Gives 'create', 'update' or None for an output, by comparing the
+        hash of its text with the manifest, or with the existing file when it
+        has been modified since the manifest was written. 
+        """
+        try:
+            stat = os.stat(endloc)
+        except OSError:
+            return 'create'
+        
+        digest = self.digest(text)
+        key = os.path.relpath(endloc, self.loc)
+        entry = self.manifest.get(key)
+        if entry == [digest, stat.st_size, stat.st_mtime_ns]:
+            return None
+        
+        with open(endloc, "rt") as f:
+            if self.digest(f.read()) == digest:
+                self.record(endloc, digest)
+                return None
+        return 'update'
+    
+    def digest(self, text):
+        """Gives the SHA-1 hex digest of a text.
+        """
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+    
+    def record(self, endloc, digest):
+        """Records the hash, size and mtime of a file in the manifest.
+        """
+        stat = os.stat(endloc)
+        key = os.path.relpath(endloc, self.loc)
+        self.manifest[key] = [digest, stat.st_size, stat.st_mtime_ns]
+    
+    def load_manifest(self):
+        """Reads the manifest of previously written files, if it exists.
+        """
+        try:
+            with open(self.manifestfile, "rt") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def save_manifest(self):
+        """Writes the manifest.
+        """
+        temp = self.manifestfile + '.tmp'
+        with open(temp, "wt") as f:
+            json.dump(self.manifest, f)
+        os.replace(temp, self.manifestfile)
+    
+    def write_file(self, output):
+        """Writes a single (endloc, text) output, returning its location.
+        """
+        endloc, text = output
+        with open(endloc, "wt") as f:
+            f.write(text)
+        return endloc
     
     def give_dirs(self, dirdefs):
         """Takes a list of directory identifiers and returns the list of 
@@ -115,17 +261,31 @@ class Generator():
         return True in checks
     
     def dictreplace(self, string, keydict):
-        """Uses a dictionary as a key for string replacements. 
+        """Uses a dictionary as a key for string replacements. All of the keys
+        are matched in a single pass, using one compiled pattern, with longer
+        keys taking precedence where they overlap. 
+        """
+        if not keydict:
+            return string
+        pattern = self.compile(keydict)
+        return pattern.sub(lambda match: keydict[match.group(0)], string)
+    
+    def compile(self, keydict):
+        """Returns the compiled alternation of the keys of a dictionary.
         """
-        for old, new in keydict.items():
-            string = string.replace(old, new)
-        return string
+        keys = tuple(sorted(keydict, key=len, reverse=True))
+        try:
+            return self.patterns[keys]
+        except KeyError:
+            pattern = re.compile("|".join(re.escape(k) for k in keys))
+            self.patterns[keys] = pattern
+            return pattern
     
     def replace_all_vals(self, infile, outfile, keydict):
         """Replaces all instances of a particular string in a file, using a
         dictionary of old:new text replacements as the key.
         """
         with open(infile, "rt") as fin:
-            with open(outfile, "wt") as fout:
-                for line in fin:
-                    fout.write(self.dictreplace(line, keydict))
\ No newline at end of file
+            text = fin.read()
+        with open(outfile, "wt") as fout:
+            fout.write(self.dictreplace(text, keydict))
\ No newline at end of file
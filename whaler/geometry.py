@@ -0,0 +1,165 @@
+"""
+This module contains vectorized functions for computing geometric descriptors
+(distances, angles, dihedrals and neighbor lists) from numpy arrays of atomic
+coordinates.
+
+Coordinates are given as an (N, 3) array. Several structures can be handled in
+a single call by stacking their coordinates and offsetting the atom indices.
+"""
+
+import numpy as np
+
+def distances(coords, pairs):
+    """Returns the distance between the atoms of each (i, j) index pair.
+    """
+    coords = np.asarray(coords, dtype=float)
+    pairs = np.asarray(pairs, dtype=int).reshape(-1, 2)
+    diff = coords[pairs[:,0]] - coords[pairs[:,1]]
+    return np.sqrt(np.einsum('ij,ij->i', diff, diff))
+
+def angles(coords, triples):
+    """Returns the angle in degrees at atom j for each (i, j, k) index triple.
+    """
+    coords = np.asarray(coords, dtype=float)
+    triples = np.asarray(triples, dtype=int).reshape(-1, 3)
+    a = coords[triples[:,0]] - coords[triples[:,1]]
+    b = coords[triples[:,2]] - coords[triples[:,1]]
+    cos = (np.einsum('ij,ij->i', a, b)
+            / np.sqrt(np.einsum('ij,ij->i', a, a)
+                        * np.einsum('ij,ij->i', b, b)))
+    return np.degrees(np.arccos(np.clip(cos, -1, 1)))
+
+def dihedrals(coords, quads):
+    """Returns the dihedral angle in degrees about the j-k bond for each
+    (i, j, k, l) index quadruple.
+    """
+    coords = np.asarray(coords, dtype=float)
+    quads = np.asarray(quads, dtype=int).reshape(-1, 4)
+    b0 = coords[quads[:,0]] - coords[quads[:,1]]
+    b1 = coords[quads[:,2]] - coords[quads[:,1]]
+    b2 = coords[quads[:,3]] - coords[quads[:,2]]
+    
+    # Project b0 and b2 onto the plane perpendicular to b1.
+    b1 = b1 / np.linalg.norm(b1, axis=1)[:,None]
+    v = b0 - np.einsum('ij,ij->i', b0, b1)[:,None]*b1
+    w = b2 - np.einsum('ij,ij->i', b2, b1)[:,None]*b1
+    x = np.einsum('ij,ij->i', v, w)
+    y = np.einsum('ij,ij->i', np.cross(b1, v), w)
+    return np.degrees(np.arctan2(y, x))
+
+def neighbors(elems, coords, elem1, elem2, cutoff):
+    """Returns the (i, j) index pairs of all elem1-elem2 atom pairs closer
+    than cutoff, along with their distances. Each pair is given once.
+    """
+    elems = np.asarray(elems)
+    coords = np.asarray(coords, dtype=float)
+    first = np.flatnonzero(elems == elem1)
+    second = np.flatnonzero(elems == elem2)
+    
+    diff = coords[first][:,None,:] - coords[second][None,:,:]
+    dist = np.sqrt(np.einsum('ijk,ijk->ij', diff, diff))
+    mask = dist < cutoff
+    
+    # Remove self-pairs, and count same-element pairs only once.
+    if elem1 == elem2:
+        mask &= first[:,None] < second[None,:]
+    
+    i, j = np.nonzero(mask)
+    pairs = np.column_stack([first[i], second[j]])
+    return (pairs, dist[i, j])
+
+def fingerprints(coords, chunk=1024):
+    """Returns the sorted interatomic distances of each structure in an
+    (M, N, 3) array, as an (M, N*(N-1)/2) array. They do not depend on the
+    orientation or atom order of the structures, and the RMS difference of
+    two fingerprints is at most twice the RMSD of the structures.
+    """
+    coords = np.asarray(coords, dtype=float)
+    i, j = np.triu_indices(coords.shape[1], 1)
+    fps = np.empty((len(coords), len(i)))
+    for start in range(0, len(coords), chunk):
+        diff = coords[start:start+chunk, i] - coords[start:start+chunk, j]
+        fps[start:start+chunk] = np.sqrt(
+            np.einsum('mpk,mpk->mp', diff, diff))
+    fps.sort(axis=1)
+    return fps
+
+def kabsch_rmsd(A, B):
+    """Returns the RMSD of each pair of structures in two (K, N, 3) arrays
+    after their optimal superposition (Kabsch), with the atoms of each pair
+    in the same order. Reflections are not allowed.
+    """
+    A = np.asarray(A, dtype=float)
+    B = np.asarray(B, dtype=float)
+    A = A - A.mean(axis=1, keepdims=True)
+    B = B - B.mean(axis=1, keepdims=True)
+    
+    # The minimal squared deviation follows from the singular values of the
+    # covariance matrix, with the last one negated for a reflection.
+    U, S, Vt = np.linalg.svd(np.einsum('kni,knj->kij', A, B))
+    S[:,-1] *= np.sign(np.linalg.det(U)*np.linalg.det(Vt))
+    msd = (np.einsum('kni,kni->k', A, A) + np.einsum('kni,kni->k', B, B)
+            - 2*S.sum(axis=1)) / A.shape[1]
+    return np.sqrt(np.clip(msd, 0, None))
+
+def cluster(coords, cutoff, priority=None, bins=8):
+    """Groups the structures of an (M, N, 3) array, with their atoms in the
+    same order, into clusters whose members are within cutoff RMSD of the
+    cluster's leader. Leaders are taken in the order of priority (a list of
+    indices, such as by energy), or of the index. Returns (leaders, rmsds):
+    the index of each structure's leader, and its RMSD from it.
+    
+    Each leader is only aligned with the structures that pass cheaper
+    tests, none of which can reject a structure within cutoff. Their
+    fingerprints must have norms within 2*cutoff (RMS) of the leader's, and
+    must differ from it by less than that when averaged over bins of
+    neighboring distances. Then the distances of their atoms from the
+    centroid must differ from the leader's by less than cutoff (RMS), and
+    finally their full fingerprints by less than 2*cutoff.
+    """
+    coords = np.asarray(coords, dtype=float)
+    count = len(coords)
+    if priority is None:
+        priority = range(count)
+    fps = fingerprints(coords)
+    bound = (2*cutoff)**2*fps.shape[1]
+    
+    # Binned fingerprints, scaled so that their distances are no larger than
+    # those of the full fingerprints. 
+    if fps.shape[1]:
+        edges = np.linspace(0, fps.shape[1], min(bins, fps.shape[1]) + 1)
+        edges = np.unique(edges.astype(int))
+        binned = (np.add.reduceat(fps, edges[:-1], axis=1)
+                    / np.sqrt(np.diff(edges)))
+    else:
+        binned = fps
+    centered = coords - coords.mean(axis=1, keepdims=True)
+    radii = np.sqrt(np.einsum('mni,mni->mn', centered, centered))
+    norms = np.sqrt(np.einsum('mp,mp->m', fps, fps))
+    order = np.argsort(norms)
+    sorted_norms = norms[order]
+    
+    leaders = np.full(count, -1)
+    rmsds = np.zeros(count)
+    for k in priority:
+        if leaders[k] >= 0:
+            continue
+        leaders[k] = k
+        
+        # Narrow down the unassigned structures, and align the rest. 
+        lo = np.searchsorted(sorted_norms, norms[k] - bound**0.5, 'left')
+        hi = np.searchsorted(sorted_norms, norms[k] + bound**0.5, 'right')
+        found = order[lo:hi]
+        found = found[leaders[found] < 0]
+        tests = (
+            (binned, bound), (radii, cutoff**2*coords.shape[1]),
+            (fps, bound))
+        for prints, limit in tests:
+            diff = prints[found] - prints[k]
+            found = found[np.einsum('mp,mp->m', diff, diff) <= limit]
+        rmsd = kabsch_rmsd(
+            coords[found], np.broadcast_to(coords[k], coords[found].shape))
+        close = rmsd < cutoff
+        leaders[found[close]] = k
+        rmsds[found[close]] = rmsd[close]
+    return (leaders, rmsds)
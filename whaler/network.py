@@ -0,0 +1,92 @@
+"""
+This module contains a reaction network engine, which evaluates many reaction
+energies at once from a table of species energies.
+
+Reactions are declared as name:stoichiometry dictionaries, where the
+stoichiometry maps species to coefficients (positive for products, negative
+for reactants). A species name containing '{}' is a pattern, filled in with
+each base structure in turn; any other name is a fixed species, such as N2.
+For example, adding N2 to every structure is declared as:
+    
+    {'Add N2' : {'{}N2':1, '{}':-1, 'N2':-1}}
+"""
+
+import numpy as np
+import pandas as pd
+
+class Network():
+    """A set of reactions applied to every base structure, compiled into a
+    sparse stoichiometry matrix with one row per (base, reaction) and one
+    column per species. The matrix is kept in coordinate form, as the row,
+    column and coefficient of each nonzero entry.
+    """
+    def __init__(self, reactions, species, bases=None):
+        self.names = list(reactions)
+        self.species = pd.Index(species)
+        if bases is None:
+            bases = self.species
+        self.bases = pd.Index(bases)
+        self.compile(reactions)
+    
+    def compile(self, reactions):
+        """Builds the stoichiometry matrix. Species that are not in the
+        network are given column -1, so that their reactions are masked out
+        when evaluated.
+        """
+        nbases = len(self.bases)
+        nrxns = len(self.names)
+        bases = np.asarray(self.bases, dtype=str)
+        rows = []
+        cols = []
+        coeffs = []
+        for r, name in enumerate(self.names):
+            for template, coeff in reactions[name].items():
+                if '{}' in template:
+                    prefix, suffix = template.split('{}', 1)
+                    names = np.char.add(np.char.add(prefix, bases), suffix)
+                else:
+                    names = np.full(nbases, template)
+                rows.append(np.arange(nbases)*nrxns + r)
+                cols.append(self.species.get_indexer(names))
+                coeffs.append(np.full(nbases, coeff, dtype=float))
+        
+        if rows:
+            self.rows = np.concatenate(rows)
+            self.cols = np.concatenate(cols)
+            self.coeffs = np.concatenate(coeffs)
+        else:
+            self.rows = np.zeros(0, dtype=int)
+            self.cols = np.zeros(0, dtype=int)
+            self.coeffs = np.zeros(0)
+    
+    def evaluate(self, values):
+        """Takes a Series of species values (energies or free energies), and
+        returns a DataFrame of the reaction values, with one row per base
+        structure and one column per reaction. A reaction involving a species
+        that is missing, or whose value is NaN, gives NaN.
+        """
+        values = pd.Series(values).reindex(self.species)
+        results = self.evaluate_array(values.to_numpy(dtype=float))
+        
+        return pd.DataFrame(
+            data=results, index=self.bases, columns=self.names)
+    
+    def evaluate_array(self, values):
+        """Takes an array of species values whose first axis follows
+        self.species, and returns an array of shape (bases, reactions, ...),
+        where any further axes (such as temperature and pressure) are carried
+        through.
+        """
+        values = np.asarray(values, dtype=float)
+        shape = values.shape[1:]
+        values = values.reshape(len(self.species), -1)
+        
+        # Column -1 picks out the row of NaN appended here.
+        values = np.vstack([values, np.full((1, values.shape[1]), np.nan)])
+        size = len(self.bases)*len(self.names)
+        results = np.column_stack([
+            np.bincount(self.rows, weights=self.coeffs*column[self.cols],
+                        minlength=size)
+            for column in values.T])
+        
+        return results.reshape((len(self.bases), len(self.names)) + shape)
@@ -0,0 +1,154 @@
+"""
+This module contains the instrumentation used to profile whaler commands:
+timers for each stage of the work (scan, validate, extract, tabulate, write),
+counters of the files opened and bytes read, and the time spent on each log.
+"""
+
+import time
+import json
+import contextlib
+import threading
+
+class Profile():
+    """An object that accumulates stage timings and counters. Stage times are
+    exclusive: time spent in a nested stage is not counted in the stage that
+    contains it, so the stage times add up to the profiled total. Each thread
+    keeps its own stack of stages, and their times are added together.
+    """
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+    
+    def reset(self):
+        """Clears all of the timings and counters.
+        """
+        self.stages = {}
+        self.counters = {}
+        self.files = {}
+        self._local = threading.local()
+        self._start = time.perf_counter()
+    
+    def enable(self):
+        """Turns on profiling, starting the clock.
+        """
+        self.enabled = True
+        self.reset()
+    
+    def stage(self, name):
+        """Returns a context manager that times a stage of the work.
+        """
+        if not self.enabled:
+            return contextlib.nullcontext()
+        return self._timed(name)
+    
+    @property
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+    
+    @contextlib.contextmanager
+    def _timed(self, name):
+        stack = self._stack
+        now = time.perf_counter()
+        if stack:
+            parent, started = stack[-1]
+            self.add_time(parent, now - started)
+        stack.append((name, now))
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            name, started = stack.pop()
+            self.add_time(name, now - started)
+            if stack:
+                stack[-1] = (stack[-1][0], now)
+    
+    def add_time(self, name, seconds):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+    
+    def count(self, name, n=1):
+        """Adds n to a counter.
+        """
+        if self.enabled:
+            with self._lock:
+                self.counters[name] = self.counters.get(name, 0) + n
+    
+    def opened(self, nbytes):
+        """Counts a file opened and the bytes read from it.
+        """
+        if self.enabled:
+            self.count('files opened')
+            self.count('bytes read', nbytes)
+    
+    def file_time(self, fn, seconds):
+        """Adds to the time spent on a single file.
+        """
+        if self.enabled:
+            with self._lock:
+                self.files[fn] = self.files.get(fn, 0.0) + seconds
+    
+    def drain(self):
+        """Returns the timings and counters gathered so far, and clears them,
+        so that they can be merged into the profile of another process.
+        """
+        data = {
+            'stages':self.stages, 'counters':self.counters,
+            'files':self.files}
+        self.stages = {}
+        self.counters = {}
+        self.files = {}
+        return data
+    
+    def merge(self, data):
+        """Adds timings and counters drained from another profile.
+        """
+        for name, seconds in data['stages'].items():
+            self.add_time(name, seconds)
+        for name, n in data['counters'].items():
+            self.count(name, n)
+        for fn, seconds in data['files'].items():
+            self.file_time(fn, seconds)
+    
+    def report(self, command='', top=10):
+        """Returns the profile as a dictionary.
+        """
+        slowest = sorted(self.files.items(), key=lambda f: f[1], reverse=True)
+        return {
+            'command':command,
+            'total seconds':time.perf_counter() - self._start,
+            'stages':self.stages,
+            'counters':self.counters,
+            'slowest files':[
+                {'file':fn, 'seconds':seconds} for fn, seconds in slowest[:top]]
+            }
+    
+    def summary(self, command='', top=10):
+        """Prints a summary of the profile.
+        """
+        report = self.report(command, top)
+        total = report['total seconds']
+        print("Profile of whaler %s: %.3f s total." % (command, total))
+        print("{0:<12}{1:>10}{2:>8}".format('stage', 'seconds', '%'))
+        for name, seconds in sorted(
+                self.stages.items(), key=lambda s: s[1], reverse=True):
+            print("{0:<12}{1:>10.3f}{2:>8.1f}".format(
+                    name, seconds, 100*seconds/total if total else 0))
+        for name, n in sorted(self.counters.items()):
+            print("{0}: {1}".format(name, n))
+        if report['slowest files']:
+            print("Slowest files:")
+            for entry in report['slowest files']:
+                print("{0:>10.4f}  {1}".format(entry['seconds'], entry['file']))
+    
+    def dump(self, fn, command='', top=10):
+        """Writes the profile to a JSON file.
+        """
+        with open(fn, "wt") as f:
+            json.dump(self.report(command, top), f, indent=2)
+
+# The profile shared by all of whaler's modules.
+profile = Profile()
@@ -0,0 +1,172 @@
+"""
+This module contains the query server (whaler serve), which holds a parsed
+campaign in memory so that scripts and notebooks can ask for its tables
+without rescanning the structure directories or rereading the output files.
+
+Requests and replies are single lines of JSON. A request names a query, and
+may narrow it to some structures with 'only':
+    
+    {"query": "gs", "only": ["Cr*"]}
+
+A reply holds the table, or the error that stopped the query:
+    
+    {"ok": true, "table": {"index": [...], "columns": [...], "data": [...]}}
+    {"ok": false, "error": "..."}
+"""
+
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from . import config
+from .catalog import select
+from .client import address
+from .custom import Reactions
+from .watch import Watcher
+
+def encode(data):
+    """Packs a DataFrame into JSON-ready lists.
+    """
+    return {
+        'index':data.index.tolist(), 'name':data.index.name,
+        'columns':data.columns.tolist(), 'data':data.values.tolist()}
+
+class Handler(socketserver.StreamRequestHandler):
+    """Answers the requests of one connection, one line at a time.
+    """
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                reply = self.server.owner.answer(
+                    request['query'], request.get('only'))
+                reply['ok'] = True
+            except Exception as e:
+                error = "%s: %s" % (type(e).__name__, e)
+                reply = {'ok':False, 'error':error}
+            self.wfile.write(json.dumps(reply).encode() + b'\n')
+            self.wfile.flush()
+
+class UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+class TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+class Server():
+    """An object that keeps the tables of a campaign in memory, refreshing
+    them from the changed logs every interval seconds, and answers queries
+    from them. A table is only computed again after a refresh has found
+    changes.
+    """
+    def __init__(self, reactions=None, spec=None, interval=None):
+        if reactions is None:
+            reactions = Reactions()
+        self.R = reactions
+        self.A = reactions.A
+        self.family, self.address = address(spec, self.A.loc)
+        
+        if interval is None:
+            interval = config.server.get('refresh_interval', 2)
+        self.interval = interval
+        self.watcher = Watcher(self.A, interval, write=False)
+        
+        # Queries, with the function that computes each table.
+        self.queries = {
+            'gs' : lambda: self.A.gEs,
+            'thermo' : lambda: self.A.therm_Es,
+            'traj' : self.A.trajectories_all,
+            'props' : self.A.props_all,
+            'dupes' : self.A.duplicates_all,
+            'crudeN2' : self.R.crude_N2_act,
+            'N2act' : self.R.therm_N2_act,
+            'N2bonds' : self.R.MMN2_bonds,
+            }
+        
+        # Computed tables, cleared whenever the campaign changes. Queries and
+        # refreshes take turns through the lock.
+        self.tables = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+    
+    def refresh(self):
+        """Rereads the changed logs. Returns the number of structures that
+        had changed.
+        """
+        with self.lock:
+            changed = self.watcher.poll()
+            structs = set().union(*changed.values())
+            if structs:
+                self.tables = {}
+                self.A.coords_refreshed = False
+            return len(structs)
+    
+    def answer(self, query, only=None):
+        """Gives the reply to a query.
+        """
+        if query == 'refresh':
+            return {'changed':self.refresh()}
+        with self.lock:
+            if query == 'structs':
+                return {'structs':list(self.A.structs)}
+            if query not in self.queries:
+                names = ['structs', 'refresh'] + list(self.queries)
+                raise KeyError("Unknown query '%s'. Choose from: %s."
+                                % (query, ", ".join(names)))
+            if query not in self.tables:
+                self.tables[query] = self.queries[query]()
+            data = self.tables[query]
+        if only:
+            data = data[data.index.isin(select(data.index.unique(), only))]
+        return {'table':encode(data)}
+    
+    def poll(self):
+        """Refreshes the tables every interval seconds, until stopped.
+        """
+        while not self.stopped.wait(self.interval):
+            try:
+                changed = self.refresh()
+            except Exception as e:
+                message = "Refresh failed: %s" % e
+                print(message)
+                self.A.logfile.appendline(message)
+                continue
+            if changed:
+                print("Refreshed %d structures." % changed)
+    
+    def run(self):
+        """Loads the campaign and serves queries until interrupted.
+        """
+        start = time.perf_counter()
+        changed = self.refresh()
+        print("Loaded %d structures in %.1f s." % (
+                    changed, time.perf_counter() - start))
+        
+        if self.family == socket.AF_UNIX:
+            if os.path.exists(self.address):
+                os.remove(self.address)
+            server = UnixServer(self.address, Handler)
+            where = self.address
+        else:
+            server = TCPServer(self.address, Handler)
+            where = "%s:%d" % server.server_address[:2]
+        server.owner = self
+        
+        poller = threading.Thread(target=self.poll, daemon=True)
+        poller.start()
+        print("Serving %s on %s. Press Ctrl-C to stop." % (
+                ", ".join(self.A.roots), where))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("Stopped serving.")
+        finally:
+            self.stopped.set()
+            server.server_close()
+            if self.family == socket.AF_UNIX and os.path.exists(self.address):
+                os.remove(self.address)
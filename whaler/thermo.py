@@ -0,0 +1,101 @@
+"""
+This module contains vectorized functions for recomputing the thermochemistry
+of many structures over grids of temperature and pressure, from their
+vibrational frequencies and the rigid-rotor and ideal-gas terms that ORCA
+reports at a single reference temperature and pressure.
+
+Energies are in Eh, entropies in Eh/K, temperatures in K and pressures in atm.
+Results are arrays of shape (structures, temperatures, pressures).
+"""
+
+import numpy as np
+
+# Boltzmann constant in Eh/K, the second radiation constant hc/k in cm*K, and
+# the energy of one wavenumber in Eh.
+kB = 3.1668114/1000000
+c2 = 1.4387769
+Eh_cm = 4.5563353/1000000
+
+# SI constants for the free-rotor entropy of the quasi-RRHO treatment, and the
+# limiting average moment of inertia (kg*m^2) used to damp it.
+h_SI = 6.62607015e-34
+kB_SI = 1.380649e-23
+c_SI = 2.99792458e10
+B_av = 1e-44
+
+def pad(rows):
+    """Takes a list of 1-D sequences of different lengths and returns them as
+    a 2-D array, padded with NaN.
+    """
+    width = max([len(row) for row in rows] + [0])
+    array = np.full((len(rows), width), np.nan)
+    for i, row in enumerate(rows):
+        array[i, :len(row)] = row
+    return array
+
+def vibrational(freqs, T, qrrho=None):
+    """Returns (ZPE, E_vib, S_vib) for a (structures, modes) array of real
+    frequencies in cm^-1, padded with NaN. ZPE has shape (structures,), and
+    the thermal energy E_vib and entropy S_vib have shape (structures,
+    temperatures). If qrrho is given, the entropy of each mode is interpolated
+    towards that of a free rotor below qrrho cm^-1, following Grimme.
+    """
+    freqs = np.asarray(freqs, dtype=float)
+    T = np.asarray(T, dtype=float)
+    nu = freqs[:, None, :]
+    x = c2*nu/T[None, :, None]
+    
+    zpe = 0.5*Eh_cm*np.nansum(freqs, axis=1)
+    e_vib = np.nansum(Eh_cm*nu/np.expm1(x), axis=2)
+    s_modes = x/np.expm1(x) - np.log(-np.expm1(-x))
+    
+    if qrrho:
+        # Free-rotor entropy of each mode, with its moment of inertia limited
+        # by B_av, mixed in with a weight that falls off below qrrho.
+        mu = h_SI/(8*np.pi**2*c_SI*nu)
+        mu = mu*B_av/(mu + B_av)
+        s_rotor = 0.5 + np.log(np.sqrt(
+            8*np.pi**3*mu*kB_SI*T[None, :, None]/h_SI**2))
+        w = 1/(1 + (qrrho/nu)**4)
+        s_modes = w*s_modes + (1 - w)*s_rotor
+    
+    s_vib = kB*np.nansum(s_modes, axis=2)
+    return (zpe, e_vib, s_vib)
+
+def grid(E, freqs, S_el, S_trans, qrot, rot_num, symm, T0, p0, T, p,
+            qrrho=None):
+    """Recomputes the enthalpy, entropy and Gibbs free energy of each
+    structure at every temperature and pressure of the grid.
+    
+    E is the electronic energy and freqs the padded frequency array. The
+    electronic entropy S_el, translational entropy S_trans and rotational
+    partition function qrot (without the symmetry number symm) are the values
+    at the reference temperature T0 and pressure p0, and are scaled from there
+    as for an ideal gas of rigid rotors with rot_num = 1 (linear) or 1.5
+    (nonlinear). Returns a dictionary of (structures, T, p) arrays.
+    """
+    E, S_el, S_trans, qrot, rot_num, symm, T0, p0 = [
+        np.asarray(a, dtype=float)[:, None, None]
+        for a in (E, S_el, S_trans, qrot, rot_num, symm, T0, p0)]
+    T = np.atleast_1d(np.asarray(T, dtype=float))
+    p = np.atleast_1d(np.asarray(p, dtype=float))
+    
+    zpe, e_vib, s_vib = vibrational(freqs, T, qrrho)
+    zpe = zpe[:, None, None]
+    e_vib = e_vib[:, :, None]
+    s_vib = s_vib[:, :, None]
+    Tg = T[None, :, None]
+    pg = p[None, None, :]
+    
+    # H = E + ZPE + E(vib) + E(rot) + E(trans) + kT
+    H = E + zpe + e_vib + (rot_num + 1.5 + 1)*kB*Tg
+    
+    # S (rot) = kB*(ln(qrot/sn) + N), with qrot proportional to T^N
+    s_rot = kB*(np.log(qrot*(Tg/T0)**rot_num/symm) + rot_num)
+    s_trans = S_trans + kB*(2.5*np.log(Tg/T0) - np.log(pg/p0))
+    S = S_el + s_vib + s_rot + s_trans
+    
+    shape = (len(E), len(T), len(p))
+    H = np.broadcast_to(H, shape)
+    S = np.broadcast_to(S, shape)
+    return {'H':H, 'S':S, 'G':H - Tg*S}
@@ -0,0 +1,243 @@
+"""
+This module contains the functions necessary to keep the result tables up to
+date while calculations are still running.
+"""
+
+import os
+import time
+from . import config
+from .analysis import Analysis
+from .catalog import select
+from .dataprep import IO
+from .dataprep import strip_compression
+
+class Watcher():
+    """An object that polls the structure directories for new or changed log
+    files, reparses only those, and rewrites the result tables when anything
+    has changed.
+    
+    A directory is only listed again when its mtime changes, which happens
+    when files are created, removed or renamed in it. Logs that are still
+    being written (those that have not yet given a valid result) are the only
+    files stat'ed on every poll.
+    """
+    def __init__(self, analysis=None, interval=None, write=True):
+        if analysis is None:
+            analysis = Analysis()
+        self.A = analysis
+        
+        if interval is None:
+            interval = config.analysis.get('watch_interval', 30)
+        self.interval = interval
+        
+        # Whether the tables are written out, or only kept in memory. 
+        self.writes = write
+        
+        # Log file suffixes, with the table and method that each feeds.
+        self.tables = {
+            'gs' : ('geo.log', 'get_states'),
+            'thermo' : ('freq.log', 'get_thermo')
+            }
+        
+        # Directory paths and mtimes, the signatures of each structure's logs, and the
+        # logs still in progress.
+        self.dirsigs = {}
+        self.logsigs = {}
+        self.pending = {}
+        
+        # Per-structure results for each table.
+        self.results = {table:{} for table in self.tables}
+    
+    def run(self):
+        """Polls until interrupted.
+        """
+        print("Watching %s. Press Ctrl-C to stop." % ", ".join(self.A.roots))
+        try:
+            while True:
+                self.poll()
+                time.sleep(self.interval)
+        except KeyboardInterrupt:
+            print("Stopped watching.")
+    
+    def poll(self):
+        """Finds the changed structures, updates their results, and rewrites
+        any table that has changed. Returns the changed structures of each
+        table.
+        """
+        changed = self.changes()
+        
+        for table, structs in changed.items():
+            if not structs:
+                continue
+            suffix, method = self.tables[table]
+            structs = sorted(structs)
+            
+            # Reparse the changed structures. Only changed logs are read.
+            present = [s for s in structs if s in self.dirsigs]
+            self.A.catalog.update(
+                {s:self.A.dirs[s] for s in present}, self.mapper)
+            values = self.A.map_structs(method, present)
+            for struct, value in zip(present, values):
+                self.results[table][struct] = value
+                self.mark_pending(struct, table, value)
+            for struct in structs:
+                if struct not in self.dirsigs:
+                    self.results[table].pop(struct, None)
+            self.A.save_cache()
+            
+            if self.writes:
+                self.write(table)
+                print("Updated {0} for {1} structures.".format(
+                            self.out(table), len(structs)))
+            else:
+                self.tabulate(table)
+        
+        return changed
+    
+    def mapper(self, func, items):
+        """Maps func over items, concurrently when the analysis uses the
+        async scanner.
+        """
+        if self.A.scanner is not None:
+            return self.A.scanner.map(func, items)
+        return [func(item) for item in items]
+    
+    def changes(self):
+        """Returns a table:set dictionary of the structures whose logs have
+        been created, changed or removed since the last poll.
+        """
+        changed = {table:set() for table in self.tables}
+        found = set()
+        
+        # Find the structure directories of every root, taking a structure
+        # found in several roots from the one with its newest log. 
+        dirs = {}
+        for root in self.A.roots:
+            with os.scandir(root) as entries:
+                for entry in entries:
+                    if entry.is_dir() and entry.path != self.A.loc:
+                        dirs.setdefault(entry.name, []).append(entry)
+        if self.A.only:
+            dirs = {s:dirs[s] for s in select(list(dirs), self.A.only)}
+        
+        # Only list the directories whose mtimes have changed.
+        for struct, entries in dirs.items():
+            found.add(struct)
+            if len(entries) > 1:
+                path = self.A.newest([entry.path for entry in entries])
+                entry = next(e for e in entries if e.path == path)
+            else:
+                entry = entries[0]
+            sig = [entry.path, entry.stat().st_mtime_ns]
+            if self.dirsigs.get(struct) != sig:
+                self.dirsigs[struct] = sig
+                self.scan_dir(struct, entry.path, changed)
+        
+        # Forget the structures that have been removed.
+        for struct in set(self.dirsigs) - found:
+            del self.dirsigs[struct]
+            for p in self.logsigs.pop(struct, {}):
+                self.pending.pop(p, None)
+            for table in self.tables:
+                changed[table].add(struct)
+        
+        # Check the logs that are still being written.
+        pending = list(self.pending.items())
+        sigs = self.mapper(self.signature, [p for p,v in pending])
+        for (path, (struct, table)), sig in zip(pending, sigs):
+            if sig != self.logsigs[struct].get(path):
+                self.logsigs[struct][path] = sig
+                changed[table].add(struct)
+        
+        # Keep the structure list in step with the directories found.
+        self.A.structs = sorted(self.dirsigs)
+        self.A.dirs = {
+            struct:self.dirsigs[struct][0] for struct in self.A.structs}
+        
+        return changed
+    
+    def scan_dir(self, struct, path, changed):
+        """Lists a structure directory, marking the structure as changed for
+        each table whose logs are new, changed or missing.
+        """
+        with os.scandir(path) as entries:
+            logs = {entry.path:entry for entry in entries if entry.is_file()}
+        sigs = self.logsigs.setdefault(struct, {})
+        
+        for table, (suffix, method) in self.tables.items():
+            current = {
+                p for p in logs if strip_compression(p).endswith(suffix)}
+            known = {
+                p for p in sigs if strip_compression(p).endswith(suffix)}
+            
+            for p in known - current:
+                del sigs[p]
+                self.pending.pop(p, None)
+                changed[table].add(struct)
+            for p in current:
+                stat = logs[p].stat()
+                sig = [stat.st_size, stat.st_mtime_ns]
+                if sigs.get(p) != sig:
+                    sigs[p] = sig
+                    changed[table].add(struct)
+    
+    def mark_pending(self, struct, table, values):
+        """Records which of a structure's logs have not yet given a valid
+        result, so that they are checked on every poll. These are the logs
+        of the latest iteration of each spin state whose state is missing
+        from the state:value dictionary the structure gave.
+        """
+        suffix, method = self.tables[table]
+        labels = {}
+        for p in self.logsigs.get(struct, {}):
+            if strip_compression(p).endswith(suffix):
+                try:
+                    labels[p] = IO(dir=os.path.dirname(p)).getcalctype(
+                                    os.path.basename(p))
+                except (ValueError, IndexError):
+                    self.pending.pop(p, None)
+        
+        latest = {}
+        for iter, state, type in labels.values():
+            latest[state] = max(iter, latest.get(state, iter))
+        for p, (iter, state, type) in labels.items():
+            if iter == latest[state] and state not in values:
+                self.pending[p] = (struct, table)
+            else:
+                self.pending.pop(p, None)
+    
+    def signature(self, path):
+        """Gives the (size, mtime) pair of a log, or None if it is gone.
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return [stat.st_size, stat.st_mtime_ns]
+    
+    def out(self, table):
+        """Gives the output filename for a table.
+        """
+        if table == 'gs':
+            return self.A.gs_out
+        else:
+            return self.A.thermo_out
+    
+    def tabulate(self, table):
+        """Rebuilds a table from the stored results, and hands it to the
+        analysis.
+        """
+        structs = sorted(self.results[table])
+        results = [self.results[table][s] for s in structs]
+        if table == 'gs':
+            data = self.A.gs_table(structs, results)
+            self.A._gEs = data
+        else:
+            data = self.A.thermo_table(structs, results)
+            self.A._therm_Es = data
+        return data
+    
+    def write(self, table):
+        """Rebuilds a table from the stored results and replaces its file.
+        """
+        self.A.write_table(self.tabulate(table), self.out(table))